@@ -0,0 +1,152 @@
+# -----------------------------------------------------------
+# Code by: Kelly Christensen
+# Python script to time each stage of the conversion on a synthetic document and save the results as JSON.
+# usage: python -m benchmarks.bench_pipeline --pages 100 --lines 30 --level glyph --output bench_results.json [--compare old.json]
+# -----------------------------------------------------------
+
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import tempfile
+import tracemalloc
+from datetime import datetime
+from time import perf_counter
+from lxml import etree
+import src
+from src.body_build import body
+from src.page_cache import PageCache
+from src.sourcedoc_build import sourcedoc
+from src.teiheader_full import FullTree
+from src.text_data import Text, alto_lines
+from src.write_output import Write
+from benchmarks.synthetic_alto import generate, LEVELS
+
+DOCUMENT = "synthetic"
+IIIF = {"scheme":"https", "server":"gallica.bnf.fr", "image_prefix":"/iiif/ark:/12148/"}
+TEI_ROOT = {"xmlns":"http://www.tei-c.org/ns/1.0", "{http://www.w3.org/XML/1998/namespace}id":f"ark_12148_{DOCUMENT}"}
+
+
+class Pipeline:
+    """The stages of the conversion of one document, each of which can be run on its own and again.
+        A stage starts from what the previous stages left (eg. the <body> is built from the <sourceDoc> of the last run of sourcedoc()),
+        and ALTO files are parsed anew by each stage that reads them.
+    Args:
+        filepaths (list): paths of the document's ALTO files
+    """
+
+    def __init__(self, filepaths):
+        self.fp = filepaths
+        self.zones = None
+        self.lines = None
+        self.root = None
+
+    def taxonomy(self):
+        # SegmOnto labels of the document, read from the <Tags> of every file (FullTree.segmonto_taxonomy())
+        tree = FullTree({"taxonomy":etree.Element("taxonomy")}, {"sru":None, "iiif":None})
+        self.zones, self.lines = tree.segmonto_taxonomy(PageCache(self.fp))
+
+    def sourcedoc(self):
+        self.root = etree.Element("TEI", TEI_ROOT)
+        sourcedoc(DOCUMENT, self.root, self.fp, {}, self.zones, self.lines, IIIF, PageCache(self.fp))
+
+    def body(self):
+        # Text and body() on the <sourceDoc>; the <text> of an earlier run is removed first
+        if self.root.find("text") is not None:
+            self.root.remove(self.root.find("text"))
+        body(self.root, Text(self.root).data)
+
+    def body_from_alto(self):
+        body(etree.Element("TEI", TEI_ROOT), alto_lines(DOCUMENT, self.fp, IIIF))
+
+    def write(self):
+        Write(DOCUMENT, self.root).write()
+
+
+STAGES = ["taxonomy", "sourcedoc", "body", "body_from_alto", "write"]
+
+
+def run_stage(pipeline, stage, repeat):
+    """Time a stage, then run it once more to measure the peak of the memory allocated by Python while it runs.
+    Returns:
+        (dict): times of the runs in seconds, best and median time, and peak Python memory in MB
+    """
+    times = []
+    for _ in range(repeat):
+        t0 = perf_counter()
+        getattr(pipeline, stage)()
+        times.append(perf_counter() - t0)
+    tracemalloc.start()
+    getattr(pipeline, stage)()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"runs":times, "best":min(times), "median":statistics.median(times), "python_peak_mb":round(peak / 2**20, 3)}
+
+
+def compare(results, filepath):
+    """Print the time of each stage against the one saved in an earlier results file.
+    """
+    with open(filepath) as f:
+        previous = json.load(f)
+    print(f"\ncompared with {filepath} ({previous['date']}):")
+    for stage, result in results["stages"].items():
+        if stage in previous["stages"]:
+            ratio = result["best"] / previous["stages"][stage]["best"]
+            colour = "\33[31m" if ratio > 1.1 else "\33[32m" if ratio < 0.9 else ""
+            print(f"{stage:<16}{previous['stages'][stage]['best']:>10.4f} s -> {result['best']:>8.4f} s  {colour}{ratio:>6.2f}x\x1b[0m")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", default=100, type=int, help="number of pages of the synthetic document")
+    parser.add_argument("--lines", default=30, type=int, help="number of text lines per page")
+    parser.add_argument("--level", default="line", choices=LEVELS, help="text at the level of the line or of the glyph")
+    parser.add_argument("--seed", default=0, type=int, help="seed of the random text")
+    parser.add_argument("--repeat", default=3, type=int, help="number of timed runs of each stage; the best and the median are kept")
+    parser.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES, help="stages to time, in this order")
+    parser.add_argument("--output", default="bench_results.json", help="JSON file in which the results are saved")
+    parser.add_argument("--compare", help="JSON file of earlier results to compare with")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+
+    with tempfile.TemporaryDirectory() as directory:
+        filepaths = generate(directory, DOCUMENT, args.pages, args.lines, args.level, args.seed)
+        alto_bytes = sum(os.path.getsize(f) for f in filepaths)
+        # Write.write() writes to './data/'
+        cwd = os.getcwd()
+        os.chdir(directory)
+        os.makedirs("data", exist_ok=True)
+        try:
+            pipeline = Pipeline(filepaths)
+            # the stages that others start from are run once before the timings
+            pipeline.taxonomy()
+            pipeline.sourcedoc()
+            stages = {}
+            for stage in args.stages:
+                stages[stage] = run_stage(pipeline, stage, args.repeat)
+                stages[stage]["pages_per_second"] = round(args.pages / stages[stage]["best"], 2)
+                print(f"{stage:<16}{stages[stage]['best']:>10.4f} s{stages[stage]['pages_per_second']:>12.1f} pages/s"
+                      f"{stages[stage]['python_peak_mb']:>10.1f} MB")
+        finally:
+            os.chdir(cwd)
+
+    results = {"date":datetime.now().isoformat(timespec="seconds"),
+               "version":src.__version__,
+               "python":platform.python_version(),
+               "lxml":".".join(map(str, etree.LXML_VERSION)),
+               "corpus":{"pages":args.pages, "lines":args.lines, "level":args.level, "seed":args.seed, "alto_bytes":alto_bytes},
+               "repeat":args.repeat,
+               "stages":stages,
+               # high-water mark of the whole process, including the memory of lxml's trees that tracemalloc does not see
+               "peak_rss_mb":round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"peak memory of the process: {results['peak_rss_mb']} MB; results saved in {output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# -----------------------------------------------------------
+# Code by: Kelly Christensen
+# Python script to compare, page by page, the ALTO and MARC queries written as path strings with the compiled queries of src/queries.py.
+# usage: python -m benchmarks.bench_queries ./data/{document} [--repeat 5]
+# -----------------------------------------------------------
+
+import argparse
+from pathlib import Path
+from timeit import repeat
+from lxml import etree
+from src.queries import ALTO_NS, SRU_NS, POLYGON_POINTS, OTHER_TAGS, SUBFIELD, first
+from src.sourcedoc_page import AltoPage
+
+# a Unimarc record with the fields read by SRU.clean()
+MARC_RECORD = b"""<s:searchRetrieveResponse xmlns:s="http://www.loc.gov/zing/srw/" xmlns:m="info:lc/xmlns/marcxchange-v2">
+<s:numberOfRecords>1</s:numberOfRecords><s:records><s:record><s:recordData><m:record>
+<m:controlfield tag="003">http://catalogue.bnf.fr/ark:/12148/cb00000000x</m:controlfield>
+<m:datafield tag="100"><m:subfield code="a">20200101d1450    m  y0frey50      ba</m:subfield></m:datafield>
+<m:datafield tag="101"><m:subfield code="a">fre</m:subfield></m:datafield>
+<m:datafield tag="102"><m:subfield code="a">FR</m:subfield></m:datafield>
+<m:datafield tag="200"><m:subfield code="a">Titre</m:subfield><m:subfield code="b">Manuscrit</m:subfield></m:datafield>
+<m:datafield tag="210"><m:subfield code="a">Paris</m:subfield><m:subfield code="c">Imprimeur</m:subfield><m:subfield code="d">1450</m:subfield></m:datafield>
+<m:datafield tag="700"><m:subfield code="a">Dupont</m:subfield><m:subfield code="b">Jean</m:subfield></m:datafield>
+<m:datafield tag="801"><m:subfield code="a">FR</m:subfield></m:datafield>
+<m:datafield tag="930"><m:subfield code="a">Fr 1</m:subfield><m:subfield code="b">751052116</m:subfield></m:datafield>
+</m:record></s:recordData></s:record></s:records></s:searchRetrieveResponse>"""
+MARC_FIELDS = [("100", "a"), ("210", "d"), ("101", "a"), ("102", "a"), ("200", "a"), ("200", "b"),
+               ("210", "a"), ("210", "c"), ("801", "a"), ("930", "a"), ("930", "b")]
+
+
+def alto_paths(page, elements):
+    for element in elements:
+        polygon = element.find('.//a:Polygon', namespaces=ALTO_NS)
+        if polygon is not None:
+            polygon.get("POINTS")
+    {t.attrib["ID"]:t.attrib["LABEL"] for t in page.root.iterfind('.//a:OtherTag', namespaces=ALTO_NS)}
+
+
+def alto_compiled(page, elements):
+    for element in elements:
+        first(POLYGON_POINTS, element)
+    {t.attrib["ID"]:t.attrib["LABEL"] for t in OTHER_TAGS(page.root)}
+
+
+def marc_paths(root):
+    for tag, code in MARC_FIELDS:
+        root.find(f'.//m:datafield[@tag="{tag}"]/m:subfield[@code="{code}"]', namespaces=SRU_NS)
+
+
+def marc_compiled(root):
+    for tag, code in MARC_FIELDS:
+        first(SUBFIELD, root, tag=tag, code=code)
+
+
+def best(function, count):
+    # best time of one call, in milliseconds
+    return min(repeat(function, number=1, repeat=count)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("document", type=Path, help="directory of a document's ALTO files")
+    parser.add_argument("--repeat", default=5, type=int, help="number of times each query is timed; the best time is kept")
+    args = parser.parse_args()
+
+    print(f"{'page':<16}{'elements':>10}{'paths (ms)':>14}{'compiled (ms)':>16}{'speedup':>10}")
+    total_paths, total_compiled = 0, 0
+    for filepath in sorted(args.document.glob("*.xml")):
+        page = AltoPage(etree.parse(str(filepath)).getroot())
+        elements = [e for name in ["TextBlock", "TextLine", "String", "SP", "Glyph"] for e in page.by_name[name]]
+        paths = best(lambda: alto_paths(page, elements), args.repeat)
+        compiled = best(lambda: alto_compiled(page, elements), args.repeat)
+        total_paths += paths
+        total_compiled += compiled
+        print(f"{filepath.name:<16}{len(elements):>10}{paths:>14.3f}{compiled:>16.3f}{paths / compiled:>9.2f}x")
+    if total_compiled:
+        print(f"{'all pages':<26}{total_paths:>14.3f}{total_compiled:>16.3f}{total_paths / total_compiled:>9.2f}x")
+
+    root = etree.fromstring(MARC_RECORD)
+    paths = best(lambda: marc_paths(root), args.repeat * 100)
+    compiled = best(lambda: marc_compiled(root), args.repeat * 100)
+    print(f"{'MARC record':<26}{paths:>14.3f}{compiled:>16.3f}{paths / compiled:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
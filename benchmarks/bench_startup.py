@@ -0,0 +1,88 @@
+# -----------------------------------------------------------
+# Code by: Kelly Christensen
+# Python script to time the cold start of the alto2tei command, with --help and on a one-page document, against a budget.
+# usage: python -m benchmarks.bench_startup --repeat 10 [--output startup_results.json]
+# -----------------------------------------------------------
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter
+from benchmarks.synthetic_alto import generate
+
+ROOT = str(Path(__file__).resolve().parent.parent)  # directory of the package src
+DOCUMENT = "startup"
+CONFIG = """data:
+  path: "./documents"
+iiifURI:
+  scheme: "https"
+  server: "gallica.bnf.fr"
+  manifest_prefix: "/iiif/ark:/12148/"
+  image_prefix: "/iiif/ark:/12148/"
+  manifest_suffix: "/manifest.json"
+"""
+# arguments of each timed command and the most seconds its median run may take;
+# the budgets leave room for a slower machine than the one they were measured on (about 0.06 s, 0.11 s and 0.10 s)
+SCENARIOS = {"help":(["--help"], 0.15),
+             "sourcedoc":(["--config", "config.yml", "--version", "1", "--sourcedoc", "--force"], 0.3),
+             "body":(["--config", "config.yml", "--version", "1", "--body", "--force"], 0.3)}
+# modules that the scenarios, none of which builds a <teiHeader>, should not import
+UNNEEDED = ["requests", "urllib3", "src.teiheader_metadata.http_cache", "src.teiheader_full", "cProfile", "concurrent.futures.process"]
+
+
+def imported(arguments, directory):
+    """Return the modules imported by a run of the command, as listed by python -X importtime.
+    """
+    run = subprocess.run([sys.executable, "-X", "importtime", "-m", "src"] + arguments,
+                         cwd=directory, env=dict(os.environ, PYTHONPATH=ROOT), capture_output=True, text=True)
+    return {line.split("|")[-1].strip() for line in run.stderr.splitlines() if line.startswith("import time:")}
+
+
+def time_command(arguments, directory, repeat):
+    """Run the command in a new interpreter several times and return the duration of each run, in seconds.
+    """
+    times = []
+    for _ in range(repeat):
+        t0 = perf_counter()
+        subprocess.run([sys.executable, "-m", "src"] + arguments, cwd=directory, env=dict(os.environ, PYTHONPATH=ROOT),
+                       stdout=subprocess.DEVNULL, check=True)
+        times.append(perf_counter() - t0)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", default=10, type=int, help="number of runs of each command; the median is compared with the budget")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS), help="commands to time")
+    parser.add_argument("--output", help="JSON file in which the results are saved")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        generate(os.path.join(directory, "documents"), DOCUMENT, pages=1, lines=30)
+        with open(os.path.join(directory, "config.yml"), "w") as f:
+            f.write(CONFIG)
+        for scenario in args.scenarios:
+            arguments, budget = SCENARIOS[scenario]
+            times = time_command(arguments, directory, args.repeat)
+            unneeded = sorted(set(UNNEEDED) & imported(arguments, directory))
+            results[scenario] = {"runs":times, "best":min(times), "median":statistics.median(times), "budget":budget, "unneeded_imports":unneeded}
+            colour = "\33[31m" if results[scenario]["median"] > budget or unneeded else "\33[32m"
+            print(f"{colour}{scenario:<12}{results[scenario]['median']:>8.4f} s (budget {budget} s)\x1b[0m"
+                  + (f"  imports {', '.join(unneeded)}" if unneeded else ""))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    # a failed budget makes the exit status non-zero, so that the benchmark can be used as a check
+    if any(r["median"] > r["budget"] or r["unneeded_imports"] for r in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
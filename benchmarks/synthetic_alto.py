@@ -0,0 +1,131 @@
+# -----------------------------------------------------------
+# Code by: Kelly Christensen
+# Python script to generate synthetic ALTO v4 documents, in the form exported by Kraken / eScriptorium, for the benchmarks.
+# usage: python -m benchmarks.synthetic_alto ./bench_data --pages 100 --lines 30 --level glyph
+# -----------------------------------------------------------
+
+import argparse
+import random
+from pathlib import Path
+
+ALTO = "http://www.loc.gov/standards/alto/ns-v4#"  # namespace for the Alto xml
+# SegmOnto tags of the generated pages, {tag ID: label}
+TAGS = {"BT1":"MainZone", "BT2":"MarginTextZone", "BT3":"NumberingZone", "BT4":"RunningTitleZone", "BT5":"MainZone:column#1",
+        "LT1":"DefaultLine", "LT2":"DropCapitalLine", "LT3":"HeadingLine"}
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+LEVELS = ["line", "glyph"]
+
+
+def polygon(x, y, w, h):
+    return f"{x} {y} {x+w} {y} {x+w} {y+h} {x} {y+h}"
+
+
+def blocks(lines):
+    """Return the text blocks of a page with the given number of lines: (tag ID, number of lines) of a running title,
+        a page number, a main zone with the lines that remain, and a marginal note.
+    """
+    return [("BT4", 1), ("BT3", 1), ("BT1", max(lines - 4, 1)), ("BT2", 2)]
+
+
+def text_line(folio, block_tag, line_number, block_line, y, level, rnd):
+    """Return the ALTO <TextLine> of one line, with its text at the level of the line or of its glyphs.
+    """
+    if block_tag in ("BT1", "BT5") and block_line == 0:
+        line_tag = rnd.choice(["LT2", "LT3"])
+    else:
+        line_tag = "LT1"
+    words = ["".join(rnd.choice(LETTERS) for _ in range(rnd.randint(1, 8))) for _ in range(rnd.randint(3, 9))]
+    width = 12 * (sum(len(w) for w in words) + len(words))
+    out = [f'<TextLine ID="eSc_line_{folio}_{line_number}" TAGREFS="{line_tag}" BASELINE="100 {y + 40} {100 + width} {y + 40}" '
+           f'HPOS="100" VPOS="{y}" WIDTH="{width}" HEIGHT="50">',
+           f'<Shape><Polygon POINTS="{polygon(100, y, width, 50)}"/></Shape>']
+    if level == "line":
+        out.append(f'<String CONTENT="{" ".join(words)}" HPOS="100" VPOS="{y}" WIDTH="{width}" HEIGHT="50"></String>')
+    else:
+        x = 100
+        for w, word in enumerate(words):
+            if w:
+                out.append(f'<SP ID="eSc_sp_{folio}_{line_number}_{w}" HPOS="{x}" VPOS="{y}" WIDTH="12" HEIGHT="50"/>')
+                x += 12
+            out.append(f'<String ID="eSc_string_{folio}_{line_number}_{w}" CONTENT="{word}" HPOS="{x}" VPOS="{y}" '
+                       f'WIDTH="{12 * len(word)}" HEIGHT="50" WC="0.{rnd.randint(10, 99)}">'
+                       f'<Shape><Polygon POINTS="{polygon(x, y, 12 * len(word), 50)}"/></Shape>')
+            for g, char in enumerate(word):
+                out.append(f'<Glyph ID="eSc_glyph_{folio}_{line_number}_{w}_{g}" CONTENT="{char}" HPOS="{x}" VPOS="{y}" '
+                           f'WIDTH="12" HEIGHT="50" GC="0.{rnd.randint(10, 99)}">'
+                           f'<Shape><Polygon POINTS="{polygon(x, y, 12, 50)}"/></Shape></Glyph>')
+                x += 12
+            out.append('</String>')
+    out.append('</TextLine>')
+    return out
+
+
+def page(folio, lines, level, rnd):
+    """Return the ALTO file of one page.
+    Args:
+        folio (int): page number
+        lines (int): number of text lines on the page
+        level (str): "line" for the text of each line in one <String>, "glyph" for <String>, <SP> and <Glyph> elements
+        rnd (random.Random): generator of the page's text
+    Returns:
+        (str): ALTO XML
+    """
+    out = [f'<?xml version="1.0" encoding="UTF-8"?>\n<alto xmlns="{ALTO}">',
+           '<Description><MeasurementUnit>pixel</MeasurementUnit>'
+           f'<sourceImageInformation><fileName>f{folio}.jpg</fileName></sourceImageInformation></Description>',
+           '<Tags>']
+    out += [f'<OtherTag ID="{id}" LABEL="{label}" DESCRIPTION="block type {label}"/>' for id, label in TAGS.items()]
+    out += ['</Tags>',
+            f'<Layout><Page WIDTH="3000" HEIGHT="{200 + 60 * (lines + 4)}" PHYSICAL_IMG_NR="{folio}" ID="eSc_dummypage_">',
+            f'<PrintSpace HPOS="0" VPOS="0" WIDTH="3000" HEIGHT="{200 + 60 * (lines + 4)}">']
+    y = 100
+    line_number = 0
+    for b, (block_tag, count) in enumerate(blocks(lines)):
+        out.append(f'<TextBlock ID="eSc_textblock_{folio}_{b}" TAGREFS="{block_tag}" HPOS="100" VPOS="{y}" WIDTH="2800" HEIGHT="{60 * count}">'
+                   f'<Shape><Polygon POINTS="{polygon(100, y, 2800, 60 * count)}"/></Shape>')
+        for block_line in range(count):
+            line_number += 1
+            out += text_line(folio, block_tag, line_number, block_line, y, level, rnd)
+            y += 60
+        out.append('</TextBlock>')
+    out.append('</PrintSpace></Page></Layout></alto>')
+    return "\n".join(out)
+
+
+def generate(directory, document, pages, lines, level="line", seed=0):
+    """Write a synthetic document, one ALTO file 'f{n}.xml' per page, in '{directory}/{document}'.
+    Args:
+        directory (str): directory of the documents
+        document (str): name of the document's directory
+        pages (int): number of pages
+        lines (int): number of text lines per page
+        level (str): "line" or "glyph", see page()
+        seed (int): seed of the random text, so that the same arguments always give the same files
+    Returns:
+        filepaths (list): paths of the ALTO files
+    """
+    rnd = random.Random(seed)
+    folder = Path(directory) / document
+    folder.mkdir(parents=True, exist_ok=True)
+    filepaths = []
+    for folio in range(1, pages + 1):
+        filepath = folder / f"f{folio}.xml"
+        filepath.write_text(page(folio, lines, level, rnd), encoding="utf-8")
+        filepaths.append(filepath)
+    return filepaths
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("directory", help="directory in which the document is written")
+    parser.add_argument("--document", default="synthetic", help="name of the document's directory")
+    parser.add_argument("--pages", default=100, type=int, help="number of pages")
+    parser.add_argument("--lines", default=30, type=int, help="number of text lines per page")
+    parser.add_argument("--level", default="line", choices=LEVELS, help="text at the level of the line or of the glyph")
+    parser.add_argument("--seed", default=0, type=int, help="seed of the random text")
+    args = parser.parse_args()
+    generate(args.directory, args.document, args.pages, args.lines, args.level, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,17 @@
-import argparse, os
-import yaml
+import argparse, io, os, sys, traceback
 from collections import namedtuple
+from contextlib import ExitStack, redirect_stdout
 from pathlib import Path
 from time import perf_counter
 
-from src.build import TEI
-from src.write_output import Write
+from src import metrics, profiling
+# The modules of the conversion (lxml), of the <teiHeader> (requests), of the configuration (yaml) and of the worker
+# processes are imported in the functions that need them, so that --help and runs without a <teiHeader> start quickly.
+
+Docs = namedtuple("Docs", ["doc_name", "filepaths"])
+Result = namedtuple("Result", ["doc_name", "output", "seconds", "error", "record"])
+# options of the command line that a worker job can set for its own document, see run_job()
+JOB_OPTIONS = ["header", "sourcedoc", "body", "version", "granularity", "stream", "incremental", "force", "page_jobs", "metrics"]
 
 def file_path(string):
     """Verify if the string passed as the argument --config is a valid file path.
@@ -22,6 +28,21 @@ def file_path(string):
         raise FileNotFoundError(string)
 
 
+def positive_int(string):
+    """Verify if the string passed as the argument --jobs is a whole number greater than 0.
+    Args:
+        string (str): number of worker processes.
+    Raises:
+        argparse.ArgumentTypeError: informs user that the number is invalid.
+    Returns:
+        (int): validated number of worker processes
+    """
+    if string.isdigit() and int(string) > 0:
+        return int(string)
+    else:
+        raise argparse.ArgumentTypeError(f"{string} is not a positive whole number")
+
+
 def get_args():
     """Parse command-line arguments and verify (1) the config file exist, (2) the TEI elements demanded can be constructed.
     """    
@@ -35,58 +56,295 @@ def get_args():
     parser.add_argument("--sourcedoc", default=False, action='store_true',
                         help="produce TEI-XML with <sourceDoc>")
     parser.add_argument("--body", default=False, action='store_true',
-                        help="produce TEI-XML with <body>")
+                        help="produce TEI-XML with <body>; without --sourcedoc, the <body> is read directly from the ALTO files")
+    parser.add_argument("--granularity", choices=["block", "line", "string", "glyph"],
+                        help="finest zones of the <sourceDoc>; the finer elements of the ALTO files are not read "
+                             "(default: the configuration's 'granularity', otherwise glyph)")
+    parser.add_argument("--jobs", default=1, type=positive_int,
+                        help="number of documents to convert in parallel worker processes")
+    parser.add_argument("--page-jobs", default=1, type=positive_int,
+                        help="number of worker processes building the pages of one document's <sourceDoc>")
+    parser.add_argument("--stream", default=False, action='store_true',
+                        help="write the <sourceDoc> page by page instead of holding the whole TEI tree in memory")
+    parser.add_argument("--incremental", default=False, action='store_true',
+                        help="convert only the ALTO files that changed since the last build, reusing the rest of it")
+    parser.add_argument("--force", default=False, action='store_true',
+                        help="convert every document, even those whose XML-TEI file is up to date")
+    parser.add_argument("--metrics", type=str,
+                        help="path to a report of the time of each stage and of the counters of each document, "
+                             "in JSON lines, or in the Prometheus textfile format if the file ends with '.prom'")
+    parser.add_argument("--profile", nargs="?", const=profiling.DIRECTORY,
+                        help="profile the conversion of each document with cProfile, write it to '{directory}/{document}.prof' "
+                             f"(default directory {profiling.DIRECTORY}) and print the slowest functions of the <sourceDoc> and <teiHeader>")
+    parser.add_argument("--profile-memory", default=False, action='store_true',
+                        help="with --profile, also trace the memory allocated by each stage with tracemalloc")
+    parser.add_argument("--serve", nargs="?", const="-",
+                        help="run as a worker that converts the documents of jobs read as JSON lines from stdin, "
+                             "or from the Unix socket at the given path, and answers each job with a JSON line")
+    cache = parser.add_mutually_exclusive_group()
+    cache.add_argument("--offline", default=False, action='store_true',
+                        help="build the <teiHeader> only from metadata responses already in the local cache")
+    cache.add_argument("--refresh-metadata", default=False, action='store_true',
+                        help="request the metadata for the <teiHeader> again instead of using the local cache")
     args = parser.parse_args()
-    return args.config, args.version, args.header, args.sourcedoc, args.body
+    if args.profile_memory and not args.profile:
+        parser.error("--profile-memory requires --profile")
+    # kept when refresh_metadata is turned off after the metadata is requested again, see main()
+    args.rebuild_header = args.refresh_metadata
+    return args
 
-def main():
-    config, version, header, sourcedoc, body = get_args()
 
-    if body and not sourcedoc: 
-        print("")
-        warning = '\n    Cannot produce <body> without <sourceDoc>.\n    To call the program with the --body option, include also the --sourcedoc option.'
-        raise Exception(warning)
+def stage(name):
+    """Time a stage of a document's conversion for --metrics and trace its memory for --profile-memory.
+    """
+    stack = ExitStack()
+    stack.enter_context(metrics.span(name))
+    stack.enter_context(profiling.stage(name))
+    return stack
+
+
+def convert(d, config, args):
+    """Convert one document, under cProfile if --profile was given.
+    Returns:
+        (dict): the document's spans and counters if --metrics was given, otherwise None
+    """
+    if not args.profile:
+        return build_document(d, config, args)
+    with profiling.profiled(d.doc_name, args.profile, args.profile_memory):
+        return build_document(d, config, args)
+
 
-    with open(config[0]) as cf_file:
+def build_document(d, config, args):
+    """Build the TEI tree of one document and write it to './data/{document}.xml'.
+    Args:
+        d (Docs): name of the document and paths of its ALTO files
+        config (dict): parsed YAML configuration file
+        args (Namespace): command-line arguments (TEI elements to build, Kraken version, number of page jobs, streaming, metadata cache, incremental build, metrics, profile)
+    Returns:
+        (dict): the document's spans and counters if --metrics was given, otherwise None
+    """
+    from src.build import TEI
+    from src.build_manifest import Manifest, DIRECTORY
+    from src.output_stamp import Stamp, tool_fingerprint
+    from src.page_cache import MAX_BYTES
+    from src.write_output import Write
+
+    if args.metrics:
+        metrics.start(d.doc_name)
+    stream = args.stream and args.sourcedoc
+    stamp = Stamp(d.doc_name, d.filepaths, Stamp.settings(config, args, tool_fingerprint()))
+    manifest = Manifest(d.doc_name, d.filepaths, config.get("build_cache") or DIRECTORY, tool_fingerprint()) if args.incremental else None
+    # instantiate the class TEI for the current document;
+    # when streaming, the parsed ALTO files are not kept between the <teiHeader> and the <sourceDoc>
+    tree = TEI(d.doc_name, d.filepaths, 0 if stream else MAX_BYTES, manifest, granularity=args.granularity)
+    tree.build_tree()
+    print("\n=====================================")
+    print(f"\33[32m~ now processing document {d.doc_name} ~\x1b[0m")
+    if args.sourcedoc and args.granularity != "glyph":
+        print(f"<sourceDoc> down to the {args.granularity} level")
+    if manifest:
+        print(f"{len(manifest.changed)} of {len(d.filepaths)} ALTO files changed since the last build")
+    os.makedirs('./data/', exist_ok=True)
+
+    if args.header:
+        print(f"\33[33mbuilding <teiHeader>\x1b[0m")
+        t0 = perf_counter()
+        from src.teiheader_metadata import http_cache
+        http_cache.configure(config.get("metadata_cache"), args.offline, args.refresh_metadata, config.get("metadata_requests"))
+        with stage("header"):
+            tree.build_header(config, args.version[0], args.offline, args.rebuild_header)
+        print("|________finished in {:.4f} seconds".format(perf_counter() - t0))
+
+    if stream:
+        # -- build and output the <sourceDoc> and <body> of the XML-TEI file page by page --
+        print(f"\33[33mstreaming <sourceDoc>{' and <body>' if args.body else ''}\x1b[0m")
+        t0 = perf_counter()
+        with stage("sourcedoc"):
+            tree.stream_sourcedoc(config, args.page_jobs, args.body)
+        print("|________finished in {:.4f} seconds".format(perf_counter() - t0))
+        if manifest:
+            manifest.save(tree.pages)
+        stamp.save()
+        return metrics.finish()
+    
+    if args.sourcedoc:
+        print(f"\33[33mbuilding <sourceDoc>{' and <body>' if args.body else ''}\x1b[0m")
+        t0 = perf_counter()
+        with stage("sourcedoc"):
+            tree.build_sourcedoc(config, args.page_jobs, args.body)
+        print("|________finished in {:.4f} seconds".format(perf_counter() - t0))
+    
+    if args.body and not args.sourcedoc:
+        print(f"\33[33mbuilding <body>\x1b[0m")
+        t0 = perf_counter()
+        with stage("body"):
+            tree.build_body(config)
+        print("|________finished in {:.4f} seconds".format(perf_counter() - t0))
+
+    # -- output XML-TEI file --
+    with stage("write"):
+        Write(d.doc_name, tree.root).write()
+    if manifest:
+        manifest.save(tree.pages)
+    stamp.save()
+    return metrics.finish()
+
+
+def convert_job(d, config, args):
+    """Convert one document in a worker process, collecting its progress output and any error
+        so that a failed document does not end the batch.
+    Returns:
+        (Result): document name, progress output, duration in seconds, traceback (None if no error), and metrics record (None if not asked for or failed)
+    """
+    output = io.StringIO()
+    error = None
+    record = None
+    t0 = perf_counter()
+    with redirect_stdout(output):
+        try:
+            record = convert(d, config, args)
+        except Exception:
+            error = traceback.format_exc()
+            metrics.finish()
+    return Result(d.doc_name, output.getvalue(), perf_counter() - t0, error, record)
+
+
+def convert_parallel(docs, config, args):
+    """Send whole documents to a pool of worker processes, print each document's output as it finishes,
+        and print a summary of the batch. A document whose worker process dies is counted as failed.
+    Returns:
+        failures (list): Result of every document that could not be converted
+        records (list): metrics record of every document that was converted, if --metrics was given
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    t0 = perf_counter()
+    failures = []
+    records = []
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {pool.submit(convert_job, d, config, args):d for d in docs}
+        for count, future in enumerate(as_completed(futures), start=1):
+            try:
+                result = future.result()
+            except Exception:
+                # the worker process died (eg. BrokenProcessPool when it is killed for lack of memory),
+                # so the document, and every other document still in the pool, is reported as failed
+                result = Result(futures[future].doc_name, "", perf_counter() - t0, traceback.format_exc(), None)
+            print(result.output, end="")
+            if result.error:
+                failures.append(result)
+                print(f"\33[31m[{count}/{len(docs)}] {result.doc_name} failed after {result.seconds:.4f} seconds\x1b[0m")
+            else:
+                print(f"[{count}/{len(docs)}] {result.doc_name} finished in {result.seconds:.4f} seconds")
+            if result.record:
+                records.append(result.record)
+
+    print("\n=====================================")
+    print(f"converted {len(docs) - len(failures)} of {len(docs)} documents in {perf_counter() - t0:.4f} seconds")
+    for result in failures:
+        print(f"\33[31m~ {result.doc_name} ~\x1b[0m")
+        print(result.error)
+    return failures, records
+
+
+def run_job(job, config, args):
+    """Convert the document of a worker job, with the worker's arguments and any of the JOB_OPTIONS that the job sets,
+        eg. {"id":1, "document":"bpt6k1234", "sourcedoc":true, "body":true}.
+    Args:
+        job (dict): "document" (name of the document's directory), and optionally "path" (directory of its ALTO files,
+                    by default in the configuration's data path), "id" (returned with the response) and JOB_OPTIONS
+        config (dict): parsed YAML configuration file, loaded once for the worker
+        args (Namespace): command-line arguments of the worker
+    Returns:
+        (dict): "document", "status" ("converted", "up to date" or "failed"), "output" (path to the XML-TEI file),
+                "seconds", "log" (progress output), "error" (traceback) and "metrics" (record, if asked for)
+    """
+    from src.output_stamp import Stamp, tool_fingerprint
+
+    unknown = set(job) - set(JOB_OPTIONS) - {"id", "document", "path"}
+    if unknown:
+        raise ValueError(f"unknown job options: {', '.join(sorted(unknown))}")
+    options = argparse.Namespace(**vars(args))
+    for option in JOB_OPTIONS:
+        if option in job:
+            setattr(options, option, job[option])
+    if "version" in job:
+        options.version = [job["version"]]
+    directory = Path(job.get("path") or Path(config["data"]["path"]) / job["document"])
+    d = Docs(job["document"], [f for f in directory.iterdir() if f.suffix==".xml"])
+    response = {"document":d.doc_name, "output":f"./data/{d.doc_name}.xml"}
+
+    if not options.force and not options.refresh_metadata and Stamp(d.doc_name, d.filepaths, Stamp.settings(config, options, tool_fingerprint())).fresh():
+        return dict(response, status="up to date")
+    result = convert_job(d, config, options)
+    return dict(response, status="failed" if result.error else "converted", seconds=round(result.seconds, 6),
+                log=result.output, error=result.error, metrics=result.record)
+
+
+def main():
+    args = get_args()
+    import yaml
+    from src.output_stamp import Stamp, tool_fingerprint
+
+    with open(args.config[0]) as cf_file:
         config = yaml.safe_load(cf_file.read())
+    # the command line's granularity overrides the configuration's
+    args.granularity = args.granularity or config.get("granularity") or "glyph"
+
+    # repositories whose settlement and name are already known are never requested from Sudoc
+    if (args.header or args.serve) and config.get("repositories"):
+        from src.teiheader_metadata import sru_data
+        sru_data.load_repositories(config["repositories"])
+
+    # keep the configuration, the metadata cache and its HTTP sessions for every job the worker receives
+    if args.serve:
+        from src import worker
+        from src.teiheader_metadata import http_cache
+        http_cache.configure(config.get("metadata_cache"), args.offline, args.refresh_metadata, config.get("metadata_requests"))
+        worker.serve(lambda job: run_job(job, config, args), args.serve)
+        return
 
     # for every directory in the path indicated in the configuration file,
     # get the directory's name (str) and the paths of its ALTO files (os.path)
-    Docs = namedtuple("Docs", ["doc_name", "filepaths"])
     docs = [Docs    (d.name,                                      # name of document folder
                     [f for f in d.iterdir() if f.suffix==".xml"]) # relative filepath for file
             for d in Path(config.get(("data"))["path"]).iterdir() if d.is_dir()]
 
-    for d in docs:
-        # instantiate the class TEI for the current document in the loop
-        tree = TEI(d.doc_name, d.filepaths)
-        tree.build_tree()
-        print("\n=====================================")
-        print(f"\33[32m~ now processing document {d.doc_name} ~\x1b[0m")
-
-        if header:
-            print(f"\33[33mbuilding <teiHeader>\x1b[0m")
-            t0 = perf_counter()
-            tree.build_header(config, version[0])
-            print("|________finished in {:.4f} seconds".format(perf_counter() - t0))
-        
-        if sourcedoc:
-            print(f"\33[33mbuilding <sourceDoc>\x1b[0m")
-            t0 = perf_counter()
-            tree.build_sourcedoc(config)
-            print("|________finished in {:.4f} seconds".format(perf_counter() - t0))
-        
-        if body:
-            print(f"\33[33mbuilding <body>\x1b[0m")
-            t0 = perf_counter()
-            tree.build_body()
-            print("|________finished in {:.4f} seconds".format(perf_counter() - t0))
-    
-        # -- output XML-TEI file --
-        if not os.path.exists('./data/'):
-            os.mkdir('./data/')
-        Write(d.doc_name, tree.root).write()
+    # skip the documents whose XML-TEI file was built from the same ALTO files, configuration, arguments and application
+    if not args.force and not args.refresh_metadata:
+        settings = Stamp.settings(config, args, tool_fingerprint())
+        stale = [d for d in docs if not Stamp(d.doc_name, d.filepaths, settings).fresh()]
+        if len(stale) < len(docs):
+            print(f"\33[32m{len(docs) - len(stale)} of {len(docs)} documents are up to date\x1b[0m")
+        docs = stale
+
+    # request the metadata of all the documents at the same time before building their <teiHeader>
+    if args.header and not args.offline:
+        print(f"\33[33mrequesting metadata for {len(docs)} documents\x1b[0m")
+        t0 = perf_counter()
+        from src.teiheader_metadata import http_cache
+        from src.teiheader_metadata.prefetch_data import Prefetch
+        http_cache.configure(config.get("metadata_cache"), args.offline, args.refresh_metadata, config.get("metadata_requests"))
+        failures = Prefetch([d.doc_name for d in docs], config["iiifURI"]).run()
+        for doc_name, error in failures.items():
+            print(f"|        \33[31mcould not request metadata for {doc_name}: {error}\x1b[0m")
+        print("|________finished in {:.4f} seconds".format(perf_counter() - t0))
+        # the responses have just been requested again, the <teiHeader> can be built from the cache
+        # (but not taken from the last build, see args.rebuild_header)
+        args.refresh_metadata = False
+
+    if args.jobs > 1:
+        failures, records = convert_parallel(docs, config, args)
+    else:
+        failures = []
+        records = [convert(d, config, args) for d in docs]
+
+    if args.metrics:
+        records = [r for r in records if r]
+        metrics.write_report(args.metrics, records)
+        print(f"\33[32mmetrics of {len(records)} documents written to {args.metrics}\x1b[0m")
+    if failures:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
-    
\ No newline at end of file
@@ -0,0 +1,55 @@
+# -----------------------------------------------------------
+# Code by: Kelly Christensen
+# Python functions to convert a document's ALTO pages held in memory to XML-TEI, without reading or writing any file.
+# usage:
+#   from src.api import tei_bytes
+#   tei = tei_bytes("bpt6k1234", [(1, alto_bytes_1), (2, alto_bytes_2)], config, sourcedoc=True, body=True)
+# -----------------------------------------------------------
+
+from collections import Counter
+from src.build import TEI
+from src.page_cache import AltoSource, MemoryPages, MAX_BYTES
+from src.write_output import Write
+
+
+def tei_tree(document, pages, config, header=False, sourcedoc=False, body=False, version=None, cache_bytes=MAX_BYTES, granularity="glyph"):
+    """Build the XML-TEI tree of a document from its ALTO pages, as the command line would build it from the document's directory.
+    Args:
+        document (str): the document's ID, used for the xml:ids and, with header=True, to request its metadata
+        pages (iterable): (folio number (int), ALTO document (bytes, or etree_Element already parsed)) of each page, in any order
+        config (dict): parsed YAML configuration file; the <sourceDoc> and <body> only need its "iiifURI" section
+        header (boolean): build the <teiHeader>, whose metadata is requested through the metadata cache (see http_cache.configure())
+        sourcedoc (boolean): build the <sourceDoc>
+        body (boolean): build the <body>; without the <sourceDoc>, it is read directly from the pages
+        version (str): version of Kraken used to create the ALTO files, for the <teiHeader>
+        cache_bytes (int): budget, in bytes of ALTO source, for the pages kept parsed between the steps
+        granularity (str): finest zones of the <sourceDoc>, "block", "line", "string" or "glyph"
+    Raises:
+        ValueError: two pages have the same folio number
+    Returns:
+        (etree_Element): root of the XML-TEI tree
+    """
+    pages = list(pages)
+    # pages are ordered and identified by their folio number, which must be unique
+    duplicates = sorted(folio for folio, n in Counter(int(folio) for folio, data in pages).items() if n > 1)
+    if duplicates:
+        raise ValueError(f"more than one page has the folio number {', '.join(map(str, duplicates))}")
+    sources = [AltoSource(folio, data) for folio, data in pages]
+    tree = TEI(document, sources, pages=MemoryPages(sources, cache_bytes), granularity=granularity)
+    tree.build_tree()
+    if header:
+        tree.build_header(config, version)
+    if sourcedoc:
+        tree.build_sourcedoc(config, with_body=body)
+    if body and not sourcedoc:
+        tree.build_body(config)
+    return tree.root
+
+
+def tei_bytes(document, pages, config, header=False, sourcedoc=False, body=False, version=None, cache_bytes=MAX_BYTES, granularity="glyph"):
+    """Convert a document's ALTO pages to XML-TEI, see tei_tree().
+    Returns:
+        (bytes): the XML-TEI document, identical to the file that the command line writes to './data/{document}.xml'
+    """
+    root = tei_tree(document, pages, config, header, sourcedoc, body, version, cache_bytes, granularity)
+    return Write(document, root).serialize()
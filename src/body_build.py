@@ -5,64 +5,85 @@
 
 from lxml import etree
 
+# element enclosing the lines of each type of text block zone; a MainZone line goes in an <ab>, and other zones' lines are left out
+CONTAINERS = {"NumberingZone":"fw", "QuireMarksZone":"fw", "RunningTitleZone":"fw", "MarginTextZone":"note"}
+# lines emphasized inside an <ab>, by enclosing them in a <hi>
+EMPHASIZED = {"DropCapitalLine", "HeadingLine"}
+
+
+def container(zone_type):
+    """Return the element that encloses the lines of a text block zone: "fw", "note", "ab", or None if they are left out.
+    """
+    if zone_type in CONTAINERS:
+        return CONTAINERS[zone_type]
+    return "ab" if zone_type[:4] == "Main" else None
+
+
+def line_style(line_type):
+    """Return how a line of a MainZone is entered in its <ab>: "hi" if it is emphasized, "lb" if it is a default line, or None if it is left out.
+    """
+    if line_type in EMPHASIZED:
+        return "hi"
+    return "lb" if line_type[:7] == "Default" else None
+
 
 def body(root, data):
+    """Build the <body> of the TEI tree from the data of each text line, in one pass.
+        The element last added to the <div> and the element last added to the open <ab> are kept as the assembler's state,
+        so that each line is placed without looking back into the tree. Each zone and line type is classified once.
+    Args:
+        root (etree_Element): XML-TEI tree
+        data (iterable): Line of each text line, in document order
+    """
     text = etree.SubElement(root, "text")
     body = etree.SubElement(text, "body")
     div = etree.SubElement(body, "div")
+    last_element = None  # last element added to the div
+    last_in_ab = None  # last element added to the last <ab>
+    containers = {}  # zone type -> container, see container()
+    styles = {}  # line type -> style, see line_style()
+
     for line in data:
-        # prepare attributes for the text block's zone
-        zone_atts = {"corresp":f"#{line.zone_id}", "type":line.zone_type}
         # prepare <lb/> with this line's xml:id as @corresp
         lb = etree.Element("lb", corresp=f"#{line.id}")
         lb.tail = f"{line.text}"
 
         # if this is the page's first line, create a <pb> with the page's xml:id
-        if int(line.n) == 1:
-            pb = etree.Element("pb", corresp=f"#{line.page_id}")
-            div.append(pb)
-        
-        # find the last element added to the div
-        last_element = div[-1]
-
-        # NumberingZone, QuireMarksZone, and RunningTitleZone line
-        if line.zone_type == "NumberingZone" or line.zone_type == "QuireMarksZone" or line.zone_type == "RunningTitleZone":
-            # enclose any page number, quire marks, or running title inside a <fw>
-            fw = etree.Element("fw", zone_atts)
-            last_element.addnext(fw)
-            fw.append(lb)
-
-        # MarginTextZone line
-        elif line.zone_type == "MarginTextZone":
-            # create a <note> if one is not already the preceding sibling
-            if last_element.tag != "note":
-                note = etree.Element("note", zone_atts)
-                last_element.addnext(note)
-                note.append(lb)
-            else:
-                last_element.append(lb)
-            
-        # MainZone line
-        elif line.zone_type[:4] == "Main":
-            # create an <ab> if one is not already the preceding sibling 
-            if last_element.tag != "ab":
-                ab = etree.Element("ab", zone_atts)
-                last_element.addnext(ab)
-                # update the last element in div
-                last_element = div[-1]
-
-            # if the line is emphasized for being 
-            if line.line_type == "DropCapitalLine" or line.line_type == "HeadingLine":
-                # check if there is already an emphasized line in this MainZone
-                ab_children = last_element.getchildren()
-                if len(ab_children) == 0 or ab_children[-1].tag != "hi" or ab_children[-1].get("rend") != line.line_type:
-                    hi = etree.Element("hi", rend=line.line_type)
-                    last_element.append(hi)
-                    hi.append(lb)
-                elif ab_children[-1].tag == "hi":
-                    ab_children[-1].append(lb)
-            
-            # if the line is not emphasized, append it to the last element in the <ab>
-            elif line.line_type[:7] == "Default":
+        if line.n == "1":
+            last_element = etree.SubElement(div, "pb", corresp=f"#{line.page_id}")
+
+        if line.zone_type not in containers:
+            containers[line.zone_type] = container(line.zone_type)
+        kind = containers[line.zone_type]
+
+        # NumberingZone, QuireMarksZone, and RunningTitleZone line: enclose it inside its own <fw>
+        if kind == "fw":
+            last_element = etree.SubElement(div, "fw", {"corresp":f"#{line.zone_id}", "type":line.zone_type})
+            last_element.append(lb)
+
+        # MarginTextZone line: create a <note> if one is not already the preceding sibling
+        elif kind == "note":
+            if last_element is None or last_element.tag != "note":
+                last_element = etree.SubElement(div, "note", {"corresp":f"#{line.zone_id}", "type":line.zone_type})
+            last_element.append(lb)
+
+        # MainZone line: create an <ab> if one is not already the preceding sibling
+        elif kind == "ab":
+            if last_element is None or last_element.tag != "ab":
+                last_element = etree.SubElement(div, "ab", {"corresp":f"#{line.zone_id}", "type":line.zone_type})
+                last_in_ab = None
+
+            if line.line_type not in styles:
+                styles[line.line_type] = line_style(line.line_type)
+            style = styles[line.line_type]
+
+            # an emphasized line joins the <hi> that ends the <ab> if it has the same type, otherwise it starts a new <hi>
+            if style == "hi":
+                if last_in_ab is None or last_in_ab.tag != "hi" or last_in_ab.get("rend") != line.line_type:
+                    last_in_ab = etree.SubElement(last_element, "hi", rend=line.line_type)
+                last_in_ab.append(lb)
+
+            # a default line is appended to the <ab>
+            elif style == "lb":
                 last_element.append(lb)
-                
\ No newline at end of file
+                last_in_ab = lb
@@ -1,9 +1,10 @@
 from lxml import etree
-from src.teiheader_metadata.clean_data import Metadata
-from src.teiheader_build import teiheader
-from src.sourcedoc_build import sourcedoc
-from src.text_data import Text
+from src import metrics
+from src.sourcedoc_build import sourcedoc, surfaces, surface_lines
+from src.page_cache import PageCache, MAX_BYTES
+from src.text_data import Text, alto_lines
 from src.body_build import body
+from src.write_output import Write
 
 class TEI:
     metadata = {"sru":None, "iiif":None}
@@ -11,9 +12,17 @@ class TEI:
     root = None
     segmonto_zones = None
     segmonto_lines = None
-    def __init__(self, document, filepaths):
+    def __init__(self, document, filepaths, cache_bytes=MAX_BYTES, manifest=None, pages=None, granularity="glyph"):
         self.d = document  # (str) this document's name / name of directory contiaining the ALTO files
-        self.fp = filepaths  # (list) paths of ALTO files
+        self.fp = filepaths  # (list) paths of ALTO files, or AltoSource of pages given in memory
+        self.pages = pages or PageCache(filepaths, cache_bytes)  # (PageCache) ALTO files parsed once and shared by every step
+        self.manifest = manifest  # (Manifest) what the last build of this document made from its unchanged files, or None
+        if manifest:
+            # the tag tables of the unchanged files are already known
+            for f in filepaths:
+                if manifest.labels(f) is not None:
+                    self.pages.tags[f] = manifest.labels(f)
+        self.granularity = granularity  # (str) finest zones of the <sourceDoc>: "block", "line", "string" or "glyph"
         self.metadata  # (dict) dict with two keys ("iiif", "sru"), each of which is equal to its own dictionary of metadata
         self.tags  # (dict) a label-ref pair for each tag used in this document's ALTO files
         self.root  # (etree_Element) root for this document's XML-TEI tree
@@ -29,14 +38,68 @@ class TEI:
         tei_root_att = {"xmlns":"http://www.tei-c.org/ns/1.0", "{http://www.w3.org/XML/1998/namespace}id":f"ark_12148_{self.d}"}
         self.root = etree.Element("TEI", tei_root_att)
     
-    def build_header(self, config, version):
+    def build_header(self, config, version, offline=False, refresh=False):
+        """Build the <teiHeader> from the document's metadata.
+            With a Manifest, the <teiHeader> of the last build is reused if the tag set and the number of pages have not changed,
+            unless the metadata is requested again (refresh).
+        """
+        if self.manifest:
+            header_key = self.manifest.header_key(self.pages, config, version, offline)
+            stored = None if refresh else self.manifest.stored_header(header_key)
+            if stored:
+                print("|        \33[32musing the <teiHeader> of the last build\x1b[0m")
+                header, self.segmonto_zones, self.segmonto_lines = stored
+                self.root.append(header)
+                return
+        # the <teiHeader>'s modules, and the HTTP client they use, are only imported for a document that needs them
+        from src.teiheader_metadata.clean_data import Metadata
+        from src.teiheader_build import teiheader
         # confirm that the metadata is being récupéré
-        self.metadata = Metadata(self.d, config["iiifURI"]).prepare()
-        self.root, self.segmonto_zones, self.segmonto_lines = teiheader(self.metadata, self.d, self.root, len(self.fp), config, version, self.fp, self.segmonto_zones, self.segmonto_lines)
+        with metrics.span("metadata"):
+            self.metadata = Metadata(self.d, config["iiifURI"]).prepare()
+        self.root, self.segmonto_zones, self.segmonto_lines = teiheader(self.metadata, self.d, self.root, len(self.fp), config, version, self.pages, self.segmonto_zones, self.segmonto_lines)
+        if self.manifest:
+            self.manifest.store_header(header_key, self.root.find("teiHeader"), self.segmonto_zones, self.segmonto_lines)
     
-    def build_sourcedoc(self, config):
-        sourcedoc(self.d, self.root, self.fp, self.tags, self.segmonto_zones, self.segmonto_lines, config["iiifURI"])
+    def build_sourcedoc(self, config, jobs=1, with_body=False):
+        """Build the <sourceDoc>, and the <body> with it if with_body is True: body() is given the lines of each page
+            as soon as the page is built, so that the data of the lines is never kept for more than one page.
+        """
+        if not with_body:
+            sourcedoc(self.d, self.root, self.fp, self.tags, self.segmonto_zones, self.segmonto_lines, config["iiifURI"], self.pages, jobs, self.manifest, self.granularity)
+            return
+        sourceDoc = etree.SubElement(self.root, "sourceDoc")
+        lines = []
+        pages = surfaces(sourceDoc, self.d, self.fp, self.segmonto_zones, self.segmonto_lines, config["iiifURI"], self.pages,
+                         jobs, self.manifest, self.granularity, lines)
+        body(self.root, surface_lines(pages, lines))
 
-    def build_body(self):
-        text = Text(self.root)
-        body(self.root, text.data)
+    def build_body(self, config=None):
+        """Build the <body> from the lines of the <sourceDoc> if it has them, otherwise directly from the ALTO files
+            (see build_sourcedoc() to build both in one pass).
+        """
+        if self.root.find("sourceDoc") is not None and self.granularity != "block":
+            text = Text(self.root)
+            body(self.root, text.data)
+        else:
+            # the lines of a <sourceDoc> of block granularity refer to their block's <zone>
+            line_zones = self.root.find("sourceDoc") is None
+            body(self.root, alto_lines(self.d, self.fp, config["iiifURI"], self.pages, line_zones))
+
+    def stream_sourcedoc(self, config, jobs=1, with_body=False):
+        """Build the <sourceDoc> one page at a time and write the XML-TEI file as it is built (see Write.stream()),
+            followed by the <body> if requested. The data of each page's lines is kept for the <body> before the page is freed.
+        """
+        sourceDoc = etree.SubElement(self.root, "sourceDoc")
+        # Write.stream() and body() both pull their input, and the <body> is written after the last <surface>, so here the
+        # Line of every line of the document is kept until then: about 450 bytes a line with its strings, ie. some 20 kB
+        # for a page of 45 lines, next to the <body> itself, which holds the same text
+        lines = []
+        pages = surfaces(sourceDoc, self.d, self.fp, self.segmonto_zones, self.segmonto_lines, config["iiifURI"], self.pages,
+                         jobs, self.manifest, self.granularity, lines if with_body else None)
+
+        def finish():
+            if with_body:
+                body(self.root, lines)
+
+        Write(self.d, self.root).stream(sourceDoc, pages, finish)
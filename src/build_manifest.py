@@ -0,0 +1,155 @@
+# -----------------------------------------------------------
+# Code by: Kelly Christensen
+# Python class to remember what was built for a document, so that a new run converts only the ALTO files that changed.
+# -----------------------------------------------------------
+
+import hashlib
+import json
+import os
+from lxml import etree
+
+DIRECTORY = "./.cache/builds"  # default directory of the documents' build manifests
+CHUNK = 1024 * 1024  # bytes read at a time when hashing a file
+# parser for the stored fragments; a page can repeat an xml:id (eg. a glyph's "-cert")
+FRAGMENT_PARSER = etree.XMLParser(collect_ids=False, huge_tree=True)
+
+
+def file_hash(filepath):
+    """Return the SHA-256 hash of a file's content.
+    """
+    h = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def key(*values):
+    """Return a hash of JSON-serializable values, used to know if what a stored fragment was built from has changed.
+    """
+    return hashlib.sha256(json.dumps(values, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class Manifest:
+    """Build manifest of one document, kept in '{directory}/{document}/manifest.json' with the fragments it lists.
+        For every ALTO file, the manifest records its size, modification time, content hash and tag table, and the
+        serialized <surface> built from it; it also records the serialized <teiHeader> and the SegmOnto labels found for it.
+        A file whose size and modification time are unchanged is not read again; otherwise it is hashed, and it is
+        only considered changed if its content is.
+        A stored <surface> is reused if its file is unchanged and the SegmOnto labels, IIIF settings, granularity and application are the same.
+        A stored <teiHeader> is reused if the tag set, the number of pages, the configuration, the Kraken version, the application
+        and the metadata mode (offline or not) are the same.
+    Args:
+        document (str): name of the document's directory
+        filepaths (list): paths of the document's ALTO files
+        directory (str): directory in which the manifests of all documents are kept
+        tool (str): fingerprint of the application (see output_stamp.tool_fingerprint()), so that a new version builds every fragment again
+    """
+
+    def __init__(self, document, filepaths, directory=DIRECTORY, tool=None):
+        self.d = document
+        self.fp = filepaths
+        self.tool = tool
+        self.dir = os.path.join(directory, document)
+        self.path = os.path.join(self.dir, "manifest.json")
+        try:
+            with open(self.path) as f:
+                self.last = json.load(f)
+        except (OSError, ValueError):
+            self.last = {"files":{}, "header":None, "surfaces":None}
+        self.files = {}  # (dict) file name -> entry of the file in the new manifest
+        self.changed = set()  # (set) paths of the files whose content is not the one of the last build
+        self.header = self.last["header"]
+        self.surfaces = self.last["surfaces"]
+        self.stored = set()  # (set) names of the files whose <surface> is in the store
+        for filepath in filepaths:
+            self.check(filepath)
+
+    def check(self, filepath):
+        name = os.path.basename(filepath)
+        stat = os.stat(filepath)
+        entry = self.last["files"].get(name)
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+            self.files[name] = entry
+        else:
+            digest = file_hash(filepath)
+            if entry and entry["hash"] == digest:
+                self.files[name] = dict(entry, size=stat.st_size, mtime=stat.st_mtime_ns)
+            else:
+                self.files[name] = {"size":stat.st_size, "mtime":stat.st_mtime_ns, "hash":digest, "labels":None, "surface":False}
+                self.changed.add(filepath)
+        if self.files[name]["surface"]:
+            self.stored.add(name)
+
+    def labels(self, filepath):
+        """Return the tag table recorded for an unchanged ALTO file, or None if the file has to be read.
+        """
+        return self.files[os.path.basename(filepath)]["labels"]
+
+    def fragment_path(self, filepath):
+        return os.path.join(self.dir, f"{os.path.splitext(os.path.basename(filepath))[0]}.surface.xml")
+
+    # -- <teiHeader> --
+    def header_key(self, pages, config, version, offline=False):
+        """Return a hash of what the <teiHeader> is built from; a <teiHeader> built only from the metadata cache (offline)
+            can miss responses, so it is not reused by a build that can request them.
+        """
+        tag_set = sorted({label for f in self.fp for label in pages.labels(f).values()})
+        return key(tag_set, len(self.fp), config, version, offline, self.tool)
+
+    def stored_header(self, header_key):
+        """Return the <teiHeader> of the last build and the SegmOnto zones and lines found for it,
+            or None if it was built from a different tag set, number of pages, configuration, version, application or metadata mode.
+        """
+        if self.header and self.header["key"] == header_key:
+            header = etree.fromstring(self.header["xml"].encode("utf-8"), FRAGMENT_PARSER)
+            return header, self.header["zones"], self.header["lines"]
+
+    def store_header(self, header_key, header, segmonto_zones, segmonto_lines):
+        self.header = {"key":header_key, "xml":etree.tostring(header, encoding="unicode"),
+                       "zones":segmonto_zones, "lines":segmonto_lines}
+
+    # -- <surface> --
+    def use_surfaces(self, segmonto_zones, segmonto_lines, config, granularity="glyph"):
+        """Declare what the <surface> elements of this build depend on besides their ALTO file.
+            If it differs from the last build, none of the stored <surface> elements is reused.
+        """
+        surfaces_key = key(segmonto_zones, segmonto_lines, config, granularity, self.tool)
+        if self.surfaces != surfaces_key:
+            self.surfaces = surfaces_key
+            self.stored.clear()
+
+    def has_surface(self, filepath):
+        return filepath not in self.changed and os.path.basename(filepath) in self.stored
+
+    def surface(self, filepath):
+        """Return the stored <surface> of an unchanged ALTO file.
+        """
+        with open(self.fragment_path(filepath), "rb") as f:
+            return etree.fromstring(f.read(), FRAGMENT_PARSER)
+
+    def store_surface(self, filepath, fragment):
+        """Store the serialized <surface> built from an ALTO file.
+        """
+        os.makedirs(self.dir, exist_ok=True)
+        with open(self.fragment_path(filepath), "wb") as f:
+            f.write(fragment)
+        self.stored.add(os.path.basename(filepath))
+
+    def save(self, pages):
+        """Write the manifest of this build, once the document's XML-TEI file has been written,
+            and delete the stored <surface> of the files that are no longer in the document.
+        Args:
+            pages (PageCache): parsed ALTO files of the document, from which the tag tables of the changed files are read
+        """
+        for filepath in self.fp:
+            entry = self.files[os.path.basename(filepath)]
+            if entry["labels"] is None:
+                entry["labels"] = pages.labels(filepath)
+            entry["surface"] = os.path.basename(filepath) in self.stored
+        os.makedirs(self.dir, exist_ok=True)
+        for name in self.last["files"]:
+            if name not in self.files and os.path.exists(self.fragment_path(name)):
+                os.remove(self.fragment_path(name))
+        with open(self.path, "w") as f:
+            json.dump({"files":self.files, "header":self.header, "surfaces":self.surfaces}, f)
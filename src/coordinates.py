@@ -0,0 +1,52 @@
+# -----------------------------------------------------------
+# Code by: Kelly Christensen
+# Python functions to convert the coordinates of ALTO polygons and baselines to TEI points and bounding boxes.
+# -----------------------------------------------------------
+
+import re
+from array import array
+
+PAIR = re.compile(r"(\d+) (\d+)")  # a point of an ALTO @POINTS or @BASELINE, eg. "2204 4621"
+
+
+def tokens(points):
+    """Split the value of an ALTO @POINTS or @BASELINE into its numbers, keeping only whole x y pairs.
+        The usual value, numbers separated by single spaces, is split without a regular expression;
+        any other value is read pair by pair, so that the result is always the same as PAIR.findall().
+    Args:
+        points (str): eg. "2204 4621 2190 4528"
+    Returns:
+        (list): numbers as strings, x and y alternating, eg. ["2204", "4621", "2190", "4528"]
+    """
+    numbers = points.split(" ")
+    if all(map(str.isdecimal, numbers)):
+        return numbers[:len(numbers) - len(numbers) % 2]
+    return [n for pair in PAIR.findall(points) for n in pair]
+
+
+def tei_points(points):
+    """Reformat the value of an ALTO @POINTS or @BASELINE for the TEI @points, joining each x to its y with a comma;
+        eg. "2204 4621 2190 4528" --> "2204,4621 2190,4528"
+    """
+    numbers = iter(tokens(points))
+    return " ".join(map(",".join, zip(numbers, numbers)))
+
+
+def integers(points):
+    """Return the numbers of an ALTO @POINTS or @BASELINE as an array of integers, x and y alternating.
+    """
+    return array("l", map(int, tokens(points)))
+
+
+def bounding_box(points):
+    """Compute the TEI bounding box of an ALTO polygon, for an element that has no @HPOS, @VPOS, @WIDTH and @HEIGHT.
+    Args:
+        points (str): value of the polygon's @POINTS
+    Returns:
+        (dict): @ulx, @uly, @lrx and @lry of the smallest rectangle around the polygon, or None if it has no point
+    """
+    values = integers(points)
+    if not values:
+        return None
+    xs, ys = values[0::2], values[1::2]
+    return {"ulx":str(min(xs)), "uly":str(min(ys)), "lrx":str(max(xs)), "lry":str(max(ys))}
@@ -0,0 +1,175 @@
+# -----------------------------------------------------------
+# Code by: Kelly Christensen
+# Python module to record how long each stage of a document's conversion takes, and what it processed, for a report.
+# -----------------------------------------------------------
+
+import json
+import os
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from functools import wraps
+from time import perf_counter
+
+PROMETHEUS = (".prom",)  # extensions of a report in the Prometheus textfile format; any other report is written as JSON lines
+
+
+class Recorder:
+    """Spans and counters of one document's conversion.
+        A span is the time of one stage, for the whole document (eg. "header") or for one of its pages (eg. "parse" of "f12.xml").
+        Stages run many times on a page, like "attributes", are added up for the page that is being built.
+    Args:
+        document (str): name of the document's directory
+    """
+
+    def __init__(self, document):
+        self.document = document
+        self.started = datetime.now().isoformat(timespec="seconds")
+        self.t0 = perf_counter()
+        self.stages = defaultdict(float)  # (dict) stage -> seconds, for the whole document
+        self.pages = defaultdict(lambda: defaultdict(float))  # (dict) page -> stage -> seconds
+        self.counters = defaultdict(int)  # (dict) counter -> value
+        self.page = None  # page whose <surface> is being built
+
+    @contextmanager
+    def span(self, stage, page=None):
+        previous = self.page
+        if page is not None:
+            self.page = page
+        t0 = perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, perf_counter() - t0, page)
+            self.page = previous
+
+    def add(self, stage, seconds, page=None):
+        page = page or self.page
+        self.stages[stage] += seconds
+        if page is not None:
+            self.pages[page][stage] += seconds
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def merge(self, record):
+        """Add the spans and counters of a record made in another process to this document's.
+        """
+        for stage, seconds in record["stages"].items():
+            self.stages[stage] += seconds
+        for page, stages in record["pages"].items():
+            for stage, seconds in stages.items():
+                self.pages[page][stage] += seconds
+        for name, n in record["counters"].items():
+            self.counters[name] += n
+
+    def record(self):
+        """Return the document's spans and counters as a JSON-serializable dict.
+        """
+        return {"document":self.document,
+                "started":self.started,
+                "seconds":round(perf_counter() - self.t0, 6),
+                "stages":{stage:round(s, 6) for stage, s in self.stages.items()},
+                "pages":{page:{stage:round(s, 6) for stage, s in stages.items()} for page, stages in self.pages.items()},
+                "counters":dict(self.counters)}
+
+
+recorder = None  # Recorder of the document being converted in this process, or None if no report was asked for
+
+
+def start(document):
+    """Start recording the conversion of a document in this process.
+    """
+    global recorder
+    recorder = Recorder(document)
+
+
+def finish():
+    """Stop recording and return the record of the document, or None if nothing was being recorded.
+    """
+    global recorder
+    record = recorder.record() if recorder else None
+    recorder = None
+    return record
+
+
+def span(stage, page=None):
+    """Time the block of a with statement as a stage of the document, or of one of its pages.
+        eg. with metrics.span("parse", "f12.xml"): ...
+    """
+    if recorder is None:
+        return nullcontext()
+    return recorder.span(stage, page)
+
+
+def add(stage, seconds, page=None):
+    if recorder is not None:
+        recorder.add(stage, seconds, page)
+
+
+def count(name, n=1):
+    """Add n to one of the document's counters, eg. "glyphs" or "bytes_read".
+    """
+    if recorder is not None:
+        recorder.count(name, n)
+
+
+def merge(record):
+    """Add a record made in a worker process, eg. of one page built by --page-jobs, to the document being recorded.
+    """
+    if recorder is not None and record:
+        recorder.merge(record)
+
+
+def timed(stage):
+    """Decorator adding the time of every call of a function to a stage of the page being built.
+    """
+    def decorate(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if recorder is None:
+                return function(*args, **kwargs)
+            t0 = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                recorder.add(stage, perf_counter() - t0)
+        return wrapper
+    return decorate
+
+
+def prometheus(records):
+    """Format the records of a run in the Prometheus textfile format, with the document and the stage as labels.
+    Returns:
+        (str): the metrics alto2tei_stage_seconds, alto2tei_document_seconds and one alto2tei_{counter}_total per counter
+    """
+    lines = ["# HELP alto2tei_document_seconds Time taken to convert a document.",
+             "# TYPE alto2tei_document_seconds gauge"]
+    lines += [f'alto2tei_document_seconds{{document="{r["document"]}"}} {r["seconds"]}' for r in records]
+    lines += ["# HELP alto2tei_stage_seconds Time taken by a stage of a document's conversion.",
+              "# TYPE alto2tei_stage_seconds gauge"]
+    lines += [f'alto2tei_stage_seconds{{document="{r["document"]}",stage="{stage}"}} {s}' for r in records for stage, s in r["stages"].items()]
+    for name in sorted({name for r in records for name in r["counters"]}):
+        lines += [f"# TYPE alto2tei_{name}_total counter"]
+        lines += [f'alto2tei_{name}_total{{document="{r["document"]}"}} {r["counters"][name]}' for r in records if name in r["counters"]]
+    return "\n".join(lines) + "\n"
+
+
+def write_report(filepath, records):
+    """Write the records of a run to a report: one JSON line per document appended to the file,
+        or, if the file's extension is .prom, the Prometheus textfile of the run, replacing the file at once
+        so that a collector never reads it half-written.
+    Args:
+        filepath (str): path to the report
+        records (list): record of each converted document, see Recorder.record()
+    """
+    if os.path.dirname(filepath):
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    if filepath.endswith(PROMETHEUS):
+        with open(f"{filepath}.tmp", "w") as f:
+            f.write(prometheus(records))
+        os.replace(f"{filepath}.tmp", filepath)
+    else:
+        with open(filepath, "a") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
@@ -0,0 +1,93 @@
+# -----------------------------------------------------------
+# Code by: Kelly Christensen
+# Python class to tell if a document's XML-TEI file is up to date with its ALTO files and the settings it was built with.
+# -----------------------------------------------------------
+
+import glob
+import json
+import os
+from functools import lru_cache
+import src
+from src.build_manifest import file_hash, key
+
+OUTPUT = "./data"  # directory of the XML-TEI files, see Write
+# command-line arguments that change the content of the XML-TEI file; a <teiHeader> built --offline can miss metadata
+# that is not in the cache yet, so a file built offline is not up to date for a run that can request it
+FLAGS = ["header", "sourcedoc", "body", "version", "granularity", "offline"]
+
+
+@lru_cache(maxsize=None)
+def tool_fingerprint():
+    """Return a hash of the application's version and of its source code, so that a new version rebuilds every document.
+    """
+    sources = sorted(glob.glob(os.path.join(os.path.dirname(src.__file__), "**", "*.py"), recursive=True))
+    return key(src.__version__, [file_hash(f) for f in sources])
+
+
+class Stamp:
+    """Sidecar file kept next to a document's XML-TEI file, './data/{document}.stamp.json', that records what the file was built from:
+        the size, modification time and content hash of every ALTO file, the configuration, the command-line arguments
+        that change the output, the application's version and source code, and the size and modification time of the XML-TEI file.
+        The document is up to date if none of them has changed. As with make, an ALTO file whose size and modification time
+        are unchanged is not read again; otherwise it is hashed, and only a change of its content makes the document out of date.
+        The metadata requested from the APIs is not part of the stamp; use --force or --refresh-metadata to rebuild with new metadata.
+    Args:
+        document (str): name of the document's directory
+        filepaths (list): paths of the document's ALTO files
+        settings (str): hash of the configuration, command-line arguments and application (see settings())
+    """
+
+    def __init__(self, document, filepaths, settings):
+        self.d = document
+        self.fp = filepaths
+        self.settings = settings
+        self.output = os.path.join(OUTPUT, f"{document}.xml")
+        self.path = os.path.join(OUTPUT, f"{document}.stamp.json")
+        try:
+            with open(self.path) as f:
+                self.last = json.load(f)
+        except (OSError, ValueError):
+            self.last = None
+
+    @staticmethod
+    def settings(config, args, tool):
+        """Return a hash of the configuration, of the command-line arguments that change the output, and of the application.
+        Args:
+            config (dict): parsed YAML configuration file
+            args (Namespace): command-line arguments
+            tool (str): fingerprint of the application (see tool_fingerprint())
+        """
+        return key(config, {flag:getattr(args, flag) for flag in FLAGS}, tool)
+
+    def inputs(self):
+        """Return the size, modification time and content hash of every ALTO file, reusing the recorded hash of unchanged files.
+        """
+        last = self.last["inputs"] if self.last else {}
+        inputs = {}
+        for filepath in self.fp:
+            name = os.path.basename(filepath)
+            stat = os.stat(filepath)
+            entry = last.get(name)
+            if not entry or entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime_ns:
+                entry = {"size":stat.st_size, "mtime":stat.st_mtime_ns, "hash":file_hash(filepath)}
+            inputs[name] = entry
+        return inputs
+
+    def fresh(self):
+        """Return True if the XML-TEI file was built from the same ALTO files, configuration, arguments and application.
+        """
+        if not self.last or self.last["settings"] != self.settings or not os.path.isfile(self.output):
+            return False
+        stat = os.stat(self.output)
+        if self.last["output"] != [stat.st_size, stat.st_mtime_ns]:
+            return False
+        inputs = self.inputs()
+        return inputs.keys() == self.last["inputs"].keys() and \
+            all(inputs[name]["hash"] == self.last["inputs"][name]["hash"] for name in inputs)
+
+    def save(self):
+        """Record what the XML-TEI file that has just been written was built from.
+        """
+        stat = os.stat(self.output)
+        with open(self.path, "w") as f:
+            json.dump({"settings":self.settings, "inputs":self.inputs(), "output":[stat.st_size, stat.st_mtime_ns]}, f)
@@ -0,0 +1,135 @@
+# -----------------------------------------------------------
+# Code by: Kelly Christensen
+# Python class to parse each of a document's ALTO files once and share the result between the steps of a run.
+# -----------------------------------------------------------
+
+import io
+import os
+from lxml import etree
+from src import metrics
+from src.queries import OTHER_TAGS
+from src.sourcedoc_page import AltoPage
+from src.sourcedoc_reader import read_tags
+MAX_BYTES = 256 * 1024 * 1024  # default budget, in bytes of ALTO source, for the parsed pages kept in memory
+
+
+def tag_table(alto_root):
+    """Map the @ID of every <OtherTag> in an ALTO file to its @LABEL.
+    """
+    return {t.attrib["ID"]:t.attrib["LABEL"] for t in OTHER_TAGS(alto_root)}
+
+
+class PageCache:
+    """Parsed ALTO pages of one document, shared by the <teiHeader> and <sourceDoc> steps.
+        Each file is parsed at most once while it fits in the memory budget. Pages are admitted in the
+        order they are first requested and kept until released; once the budget is spent, further pages
+        are parsed on demand without being kept, so a second pass over the files re-parses only those.
+        The tag table of every file is small and always kept; if the file has not been parsed, it is read
+        incrementally up to the end of the file's <Tags> only.
+    """
+
+    def __init__(self, filepaths, max_bytes=MAX_BYTES):
+        self.filepaths = filepaths  # (list) paths of ALTO files
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.pages = {}  # (dict) file path -> (AltoPage, size of the file in bytes)
+        self.tags = {}  # (dict) file path -> tag table of the file
+
+    def page(self, filepath):
+        """Return the AltoPage for an ALTO file, parsing it only if it is not already in memory.
+        """
+        if filepath in self.pages:
+            metrics.count("page_cache_hits")
+            return self.pages[filepath][0]
+        with metrics.span("parse", os.path.basename(filepath)):
+            alto_page = AltoPage(etree.parse(str(filepath)).getroot())
+        self.tags.setdefault(filepath, tag_table(alto_page.root))
+        size = os.path.getsize(filepath)
+        metrics.count("pages_parsed")
+        metrics.count("bytes_read", size)
+        if self.used + size <= self.max_bytes:
+            self.pages[filepath] = (alto_page, size)
+            self.used += size
+        return alto_page
+
+    def labels(self, filepath):
+        """Return the label of each tag used in an ALTO file, {tag ID (str): label (str)}.
+        """
+        if filepath not in self.tags:
+            with metrics.span("labels", os.path.basename(filepath)):
+                self.tags[filepath] = read_tags(filepath)
+        return self.tags[filepath]
+
+    def stream(self, filepath):
+        """Open an ALTO file for an incremental reading (see sourcedoc_reader.records()), unless its parsed tree is already in memory.
+        Returns:
+            (file): the file opened in binary mode, or None if the parsed tree should be used instead
+        """
+        if filepath in self.pages:
+            return None
+        metrics.count("pages_streamed")
+        return open(filepath, "rb")
+
+    def release(self, filepath):
+        """Free the parsed tree of an ALTO file that no later step needs.
+        """
+        if filepath in self.pages:
+            self.used -= self.pages.pop(filepath)[1]
+
+
+class AltoSource:
+    """An ALTO page given in memory instead of as a file, which stands for the file's path in the steps of a run.
+        Its name is the one the page's file would have, so that the pages are ordered by folio like files.
+    Args:
+        folio (int): folio number of the page
+        data (bytes or etree_Element): the ALTO document, serialized or already parsed
+    """
+    __slots__ = ("name", "data")
+
+    def __init__(self, folio, data):
+        self.name = f"f{int(folio)}.xml"
+        self.data = data.getroot() if isinstance(data, etree._ElementTree) else data
+
+    def __repr__(self):
+        return f"AltoSource({self.name})"
+
+
+class MemoryPages(PageCache):
+    """Parsed ALTO pages of a document given in memory, as AltoSource objects, with the same memory budget as PageCache.
+        A page given as bytes is parsed when it is first needed, and again if it was not kept;
+        a page given as an element is used as it is and never counts against the budget.
+    """
+
+    def page(self, source):
+        if source in self.pages:
+            metrics.count("page_cache_hits")
+            return self.pages[source][0]
+        if not isinstance(source.data, bytes):
+            alto_page = AltoPage(source.data)
+            size = 0
+        else:
+            with metrics.span("parse", source.name):
+                alto_page = AltoPage(etree.fromstring(source.data))
+            size = len(source.data)
+            metrics.count("pages_parsed")
+            metrics.count("bytes_read", size)
+        self.tags.setdefault(source, tag_table(alto_page.root))
+        if self.used + size <= self.max_bytes:
+            self.pages[source] = (alto_page, size)
+            self.used += size
+        return alto_page
+
+    def stream(self, source):
+        if source in self.pages or not isinstance(source.data, bytes):
+            return None
+        metrics.count("pages_streamed")
+        return io.BytesIO(source.data)
+
+    def labels(self, source):
+        if source not in self.tags:
+            with metrics.span("labels", source.name):
+                if isinstance(source.data, bytes):
+                    self.tags[source] = read_tags(io.BytesIO(source.data))
+                else:
+                    self.tags[source] = tag_table(source.data)
+        return self.tags[source]
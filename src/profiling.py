@@ -0,0 +1,103 @@
+# -----------------------------------------------------------
+# Code by: Kelly Christensen
+# Python module to run a document's conversion under cProfile and, optionally, trace the memory allocated by each stage.
+# -----------------------------------------------------------
+
+import os
+import re
+from contextlib import contextmanager, nullcontext
+
+DIRECTORY = "./profiles"
+HOT_MODULES = re.compile(r"src[\\/](sourcedoc_|teiheader_)")  # modules whose functions are listed after a profiled run
+TOP = 15  # number of functions listed
+
+
+class Profile:
+    """cProfile run of one document's conversion, written to '{directory}/{document}.prof'.
+        The file can be read again with pstats or a viewer such as snakeviz.
+    Args:
+        document (str): name of the document's directory
+        directory (str): directory of the profile files
+        memory (bool): True if the memory allocated by each stage is traced with tracemalloc
+    """
+
+    def __init__(self, document, directory=DIRECTORY, memory=False):
+        self.document = document
+        self.filepath = os.path.join(directory, f"{document}.prof")
+        self.memory = memory
+        self.allocations = {}  # (dict) stage -> (peak MB, MB still allocated at the end of the stage)
+        # imported here so that a run without --profile does not load the profiler
+        import cProfile
+        self.profiler = cProfile.Profile()
+
+    def __enter__(self):
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.disable()
+        os.makedirs(os.path.dirname(self.filepath) or ".", exist_ok=True)
+        self.profiler.dump_stats(self.filepath)
+
+    @contextmanager
+    def stage(self, name):
+        """Trace the memory allocated by Python during a stage, if memory tracing was asked for.
+            The trace is started and stopped around each stage, so a stage's peak does not include the earlier ones.
+        """
+        import tracemalloc
+        if not self.memory or tracemalloc.is_tracing():
+            yield
+            return
+        tracemalloc.start()
+        try:
+            yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.allocations[name] = (peak / 2**20, current / 2**20)
+
+    def hot_functions(self, top=TOP):
+        """Return the functions of the <sourceDoc> and <teiHeader> modules that took the most time, excluding their calls to other functions.
+        Returns:
+            (list): (own seconds, cumulative seconds, number of calls, "module:line(function)") of each function, slowest first
+        """
+        import pstats
+        stats = pstats.Stats(self.profiler).stats
+        functions = [(tt, ct, nc, f"{os.path.basename(filename)}:{line}({name})")
+                     for (filename, line, name), (cc, nc, tt, ct, callers) in stats.items() if HOT_MODULES.search(filename)]
+        return sorted(functions, reverse=True)[:top]
+
+    def report(self, top=TOP):
+        """Print the hot functions of the run and, if they were traced, the allocations of each stage.
+        """
+        print(f"\33[33mprofile of {self.document} written to {self.filepath}\x1b[0m")
+        print("|        own (s)   total (s)      calls  function")
+        for tt, ct, nc, function in self.hot_functions(top):
+            print(f"|        {tt:>7.4f}   {ct:>9.4f}  {nc:>9}  {function}")
+        for name, (peak, current) in self.allocations.items():
+            print(f"|        {name}: peak {peak:.2f} MB allocated, {current:.2f} MB still allocated at its end")
+
+
+profile = None  # Profile of the document being converted in this process, or None if it is not profiled
+
+
+def stage(name):
+    """Trace the memory of a stage of the document being profiled, if any.
+    """
+    if profile is None:
+        return nullcontext()
+    return profile.stage(name)
+
+
+@contextmanager
+def profiled(document, directory=DIRECTORY, memory=False):
+    """Profile the block of a with statement as the conversion of a document, then print its hot functions.
+    """
+    global profile
+    profile = Profile(document, directory, memory)
+    try:
+        with profile:
+            yield profile
+        profile.report()
+    finally:
+        profile = None
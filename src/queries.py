@@ -0,0 +1,38 @@
+# -----------------------------------------------------------
+# Code by: Kelly Christensen
+# Python module of the compiled XPath queries for the fixed paths of ALTO v4 and MARCXchange (SRU) documents.
+# -----------------------------------------------------------
+
+from lxml import etree
+
+ALTO_NS = {'a':"http://www.loc.gov/standards/alto/ns-v4#"}  # namespace for the Alto xml
+SRU_NS = {"s":"http://www.loc.gov/zing/srw/", "m":"info:lc/xmlns/marcxchange-v2"}  # namespaces for the SRU API's Unimarc records
+
+# Each query is compiled once, when the module is imported; lxml then evaluates it without parsing the path again.
+# Values that vary between calls (a MARC tag or subfield code) are passed as XPath variables, eg. SUBFIELD(root, tag="200", code="a").
+
+# -- ALTO v4 --
+# @POINTS of the first <Polygon> inside a layout element, ie. its own <Shape> (same as find('.//a:Polygon'))
+POLYGON_POINTS = etree.XPath("descendant::a:Polygon[1]/@POINTS", namespaces=ALTO_NS)
+# every <OtherTag> of the file's <Tags>
+OTHER_TAGS = etree.XPath("//a:OtherTag", namespaces=ALTO_NS)
+
+# -- MARCXchange --
+NUMBER_OF_RECORDS = etree.XPath("descendant::s:numberOfRecords[1]", namespaces=SRU_NS)
+CONTROLFIELD = etree.XPath("descendant::m:controlfield[@tag=$tag]", namespaces=SRU_NS)
+DATAFIELD = etree.XPath("descendant::m:datafield[@tag=$tag]", namespaces=SRU_NS)
+# <subfield> with the code $code of any <datafield> with the tag $tag
+SUBFIELD = etree.XPath("descendant::m:datafield[@tag=$tag]/m:subfield[@code=$code]", namespaces=SRU_NS)
+# <subfield> with the code $code of the given <datafield>
+OWN_SUBFIELD = etree.XPath("m:subfield[@code=$code]", namespaces=SRU_NS)
+
+
+def first(query, element, **variables):
+    """Return the first result of a compiled query in document order, or None, like find().
+    Args:
+        query (etree.XPath): one of the queries of this module
+        element (etree_Element): context node of the query
+        variables: values of the query's XPath variables, eg. tag="930", code="b"
+    """
+    results = query(element, **variables)
+    return results[0] if results else None
@@ -3,23 +3,27 @@
 # Python class to parse the attributes of the <sourceDoc>'s elements.
 # -----------------------------------------------------------
 
-from lxml import etree
 import re
 from collections import namedtuple
+from src import metrics
+from src.coordinates import tei_points, bounding_box
+from src.queries import POLYGON_POINTS, first
 
-NS = {'a':"http://www.loc.gov/standards/alto/ns-v4#"}  # namespace for the Alto xml
+ZoneData = namedtuple("ZoneData", ["attributes", "id"])
 
 
 class Attributes:
-    def __init__(self, doc, folio, alto_root, tags, config):
+    def __init__(self, doc, folio, alto_page, tags, config):
         self.doc = doc
         self.folio = folio
-        self.root = alto_root
+        self.page = alto_page  # (AltoPage) index of the ALTO file's layout elements
+        self.root = alto_page.root
         self.tags = tags
         self.scheme = config["scheme"]
         self.server = config["server"]
         self.prefix = config["image_prefix"]
 
+    @metrics.timed("attributes")
     def surface(self):
         """Create attributes for the TEI <surface> element using data parsed from the ALTO file's <Page> element.
             The TEI attributes for <surface> are: @n (page number), 
@@ -32,7 +36,7 @@ class Attributes:
         """    
 
         # create a dictionary of attributes names and their values for the ALTO file's <Page> element
-        att_list = self.root.find('.//a:Page', namespaces=NS).attrib
+        att_list = self.page.page.attrib
         # assign the ALTO file's extracted <Page> attribute values to TEI attribute names
         attributes = {"{http://www.w3.org/XML/1998/namespace}id":f"f{self.folio}",
                     "n":att_list["PHYSICAL_IMG_NR"],
@@ -42,78 +46,95 @@ class Attributes:
                     "lry":att_list["HEIGHT"]}
         return attributes
 
-    def zones(self, parent, target, segmonto_labels):
-        """Create attributes for one of the two types of TEI <zone> elements: (a) TextBlock and (b) TextLine.
+    def labels(self, element, segmonto_labels):
+        """Create the type attributes of the TEI <zone> of an ALTO element (see zone_labels()).
 
         Args:
-            parent (str): parent's entity name and @ID in the ALTO file for the entity being transformed into a <zone>, followed by a '/'
-                            eg. 'TextBlock[@ID="eSc_textblock_20c2f4d8"]'
-            target (str): entity name in the ALTO file for the entity being transformed into a <zone>
-                            eg. 'TextLine'
+            element (etree_Element): ALTO element being transformed into a <zone>
+            segmonto_labels (list): SegmOnto labels used in the document, or None
         Returns:
-            attributes (list): list of dictionaries {attribute name (str): value (str)}
-            processed_blocks (list): IDs of the elements whose data were extracted
-        """        
-
-        # Empty variables in which the zone's data will be stored
-        ZoneData = namedtuple("ZoneData", ["attributes", "id"])
-        output = []
-
-        # List all the XML elements that are children of the given parent
-        element_list = [z for z in self.root.findall(f'.//a:{parent}/a:{target}', namespaces=NS)]
-        #print(element_list)
-
-        for element in element_list:
-            # Only parse data from elements that have an ID / are valid
-            if "ID" in element.attrib:
-                attributes={}
-                id=element.attrib["ID"]
-                # Instantiate the named tuple ZoneData with an empty dictionary and the element's ID if it was found
-                data = ZoneData(attributes, id)
-                if "TAGREFS" in element.attrib and element.attrib["TAGREFS"] in self.tags:
-                    tag = str(self.tags[element.attrib["TAGREFS"]])
-                    
-                    # parse the three (possible) components of the targeted ALTO element's @TAGREFS, according to SegmOnto guidelines;
-                    # the 3 groups of this regex parse the following expected tag syntax: MainZone:column#1 --> (MainZone)(column)(1)
-                    tag_parts = re.match(r"(\w+):?(\w+)?#?(\d?)?", tag)
-                    data.attributes["type"]=tag_parts.group(1) or "none"
-                    main_type =  data.attributes["type"]
-                    if segmonto_labels is not None and main_type in segmonto_labels:
-                        data.attributes["corresp"]=f"#{main_type}"
-                    data.attributes["subtype"]=tag_parts.group(2) or "none"
-                    data.attributes["n"]=tag_parts.group(3) or "none"
-
-                # If XML element does not have attribute @TAGREFS (aka, is a segment/space/glyph), assign it a type
-                else:
-                    main_type = etree.QName(element).localname
-                    if main_type=="SP":
-                        main_type="Space"
-                    data.attributes["type"]=main_type
-                    #print(main_type)
-
-                # Only parse coordinate data if it is present
-                if "HPOS" in element.attrib:
-                    x = element.attrib["HPOS"]
-                    y = element.attrib["VPOS"]
-                    w = element.attrib["WIDTH"]
-                    h = element.attrib["HEIGHT"]
-
-                    data.attributes["ulx"]=x
-                    data.attributes["uly"]=y
-                    data.attributes["lrx"]=str(int(w)+int(x))
-                    data.attributes["lry"]=str(int(h)+int(y))
-
-                # Extract the attributes for the child <Polygon> of each targeted ALTO element and put that dictionary into a list
-                if element.find('.//a:Polygon', namespaces=NS) is not None and element.find('.//a:Polygon', namespaces=NS).attrib["POINTS"] is not None:
-                    points = element.find('.//a:Polygon', namespaces=NS).attrib["POINTS"]
-                    # Reformat the string of numbers from Polygon[@POINTS] so that every 2nd value is joined to the previous value by a comma; 
-                    # eg. "2204 4621 2190 4528" --> "2204,4621 2190,4528"
-                    data.attributes["points"]=" ".join([re.sub(r"\s", ",", x) for x in re.findall(r"(\d+ \d+)", points)])
-
-                # Only parse coordinate data if it is present
-                if "HPOS" in element.attrib:
-                    data.attributes["source"]=f"{self.scheme}://{self.server}{self.prefix}/{self.doc}/f{self.folio}/{x},{y},{w},{h}/full/0/native.jpg"
-
-                output.append(data)
-
-        return output
\ No newline at end of file
+            attributes (dict): dictionary of attribute names and their values
+        """
+        return zone_labels(element.attrib, self.page.name(element), self.tags, segmonto_labels)
+
+    @metrics.timed("attributes")
+    def zone(self, element, segmonto_labels):
+        """Create attributes for the TEI <zone> of an ALTO element already in hand (TextBlock, TextLine, String, SP or Glyph).
+
+        Args:
+            element (etree_Element): ALTO element being transformed into a <zone>
+            segmonto_labels (list): SegmOnto labels used in the document, or None
+        Returns:
+            data (ZoneData): the zone's attributes {attribute name (str): value (str)} and the element's @ID,
+                            or None if the element does not have an ID / is not valid
+        """
+        atts = element.attrib
+        # Only parse data from elements that have an ID / are valid
+        if "ID" not in atts:
+            return None
+        # Instantiate the named tuple ZoneData with the element's type and the element's ID
+        data = ZoneData(self.labels(element, segmonto_labels), atts["ID"])
+
+        # Get the @POINTS of the child <Polygon> of the targeted ALTO element
+        points = first(POLYGON_POINTS, element)
+
+        # Only parse coordinate data if it is present
+        if "HPOS" in atts:
+            x = atts["HPOS"]
+            y = atts["VPOS"]
+            w = atts["WIDTH"]
+            h = atts["HEIGHT"]
+
+            data.attributes["ulx"]=x
+            data.attributes["uly"]=y
+            data.attributes["lrx"]=str(int(w)+int(x))
+            data.attributes["lry"]=str(int(h)+int(y))
+
+        # Otherwise, take the coordinates of the rectangle around the element's polygon
+        elif points is not None:
+            data.attributes.update(bounding_box(points) or {})
+
+        if points is not None:
+            # Reformat the string of numbers from Polygon[@POINTS] so that every 2nd value is joined to the previous value by a comma; 
+            # eg. "2204 4621 2190 4528" --> "2204,4621 2190,4528"
+            data.attributes["points"]=tei_points(points)
+
+        # Only parse coordinate data if it is present
+        if "HPOS" in atts:
+            data.attributes["source"]=f"{self.scheme}://{self.server}{self.prefix}/{self.doc}/f{self.folio}/{x},{y},{w},{h}/full/0/native.jpg"
+
+        return data
+
+
+def zone_labels(atts, name, tags, segmonto_labels):
+    """Create the type attributes of the TEI <zone> of an ALTO element: @type, and @corresp, @subtype and @n if the element has a tag.
+
+    Args:
+        atts (dict): the ALTO element's attributes
+        name (str): local name of the ALTO element, eg. "TextLine"
+        tags (dict): label of each tag used in the ALTO file
+        segmonto_labels (list): SegmOnto labels used in the document, or None
+    Returns:
+        attributes (dict): dictionary of attribute names and their values
+    """
+    attributes = {}
+    if "TAGREFS" in atts and atts["TAGREFS"] in tags:
+        tag = str(tags[atts["TAGREFS"]])
+        
+        # parse the three (possible) components of the targeted ALTO element's @TAGREFS, according to SegmOnto guidelines;
+        # the 3 groups of this regex parse the following expected tag syntax: MainZone:column#1 --> (MainZone)(column)(1)
+        tag_parts = re.match(r"(\w+):?(\w+)?#?(\d?)?", tag)
+        attributes["type"]=tag_parts.group(1) or "none"
+        main_type =  attributes["type"]
+        if segmonto_labels is not None and main_type in segmonto_labels:
+            attributes["corresp"]=f"#{main_type}"
+        attributes["subtype"]=tag_parts.group(2) or "none"
+        attributes["n"]=tag_parts.group(3) or "none"
+
+    # If XML element does not have attribute @TAGREFS (aka, is a segment/space/glyph), assign it a type
+    else:
+        main_type = name
+        if main_type=="SP":
+            main_type="Space"
+        attributes["type"]=main_type
+    return attributes
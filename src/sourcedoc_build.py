@@ -3,119 +3,235 @@
 # Python script to map all the data of an ALTO file to the <sourceDoc> of a TEI file.
 # -----------------------------------------------------------
 
-from collections import defaultdict
+from contextlib import ExitStack
+from functools import partial
+from src import metrics
 from src.order_files import Files
+from src.page_cache import PageCache
 from src.sourcedoc_attributes import Attributes
-from src.sourcedoc_elements import SurfaceTree
+from src.sourcedoc_elements import SurfaceTree, XML_ID
+from src.text_data import Line, Text, text_blocks, page_lines
 from lxml import etree
 
-NS = {'a':"http://www.loc.gov/standards/alto/ns-v4#"}  # namespace for the Alto xml
+# parser for the <surface> elements returned by worker processes; a page can repeat an xml:id (eg. a glyph's "-cert")
+SURFACE_PARSER = etree.XMLParser(collect_ids=False, huge_tree=True)
+# finest zones the <sourceDoc> can go down to, from the coarsest to the finest: text blocks, then their lines (with the
+# line's text), then the lines' segments (<String> and <SP>), then the segments' glyphs (with each glyph's character)
+GRANULARITIES = ["block", "line", "string", "glyph"]
+BLOCK, LINE, STRING, GLYPH = range(len(GRANULARITIES))
+
+
+def depth(granularity):
+    """Return the depth of the finest zones of the <sourceDoc>.
+    Args:
+        granularity (str): one of GRANULARITIES
+    Raises:
+        ValueError: informs user that the granularity is unknown
+    Returns:
+        (int): BLOCK, LINE, STRING or GLYPH
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"unknown granularity {granularity!r}, expected one of {', '.join(GRANULARITIES)}")
+    return GRANULARITIES.index(granularity)
+
+
+def page_surface(surface_group, document_name, file, tags, segmonto_zones, segmonto_lines, config, alto_page, granularity="glyph", lines=None):
+    """Creates the <surface> for one ALTO file (one page of the document) inside the given <sourceDoc>.
+        The traversal of the ALTO file stops at the granularity's level: the finer elements are never read.
+    Args:
+        surface_group (etree_Element): parent of the new <surface>
+        file (File): folio number and path of the ALTO file
+        tags (dict): label of each tag used in the ALTO file
+        alto_page (AltoPage): parsed and indexed XML tree of the ALTO file
+        granularity (str): finest zones of the <surface>, one of GRANULARITIES
+        lines (list): if given, the Line of each text line is appended to it, for the <body>, even if its <line> is not created
+                      (the Line then refers to the block's <zone>)
+    Returns:
+        surface (etree_Element): the page's <surface>
+    """
+    finest = depth(granularity)
+    # Start count at 0 for number of entities on a page; the blocks and lines are numbered by text_blocks().
+    blocks_on_page = 0
+    lines_on_page = 0
+    strings_on_page = 0
+    glyphs_on_page = 0
+
+    # Instantiate the classes Attributes and SurfaceTree for the ALTO file
+    attributes = Attributes(document_name, file.num, alto_page, tags, config)
+    surface_tree = SurfaceTree(document_name, file.num, alto_page)
+
+    # -- SURFACE --
+    # For every page in the ALTO file, create a <surface> and assign its attributes.
+    surface = surface_tree.surface(surface_group, attributes.surface())
+
+    # -- TEXTBLOCK --
+    # For every <TextBlock> in a <PrintSpace> that has an @ID, create a <zone> and assign it attributes.
+    for textblock_element, blocks_on_page, textlines in text_blocks(alto_page):
+        tb = attributes.zone(textblock_element, segmonto_zones)
+        textblock = surface_tree.zone1(surface, tb.attributes, tb.id, blocks_on_page)
+        if finest < LINE:
+            # the lines have no <zone>, but their data is still read in this pass if the <body> needs it;
+            # each line then refers to its block's <zone>
+            if lines is not None:
+                for textline_element, n, text in textlines:
+                    if text is not None:
+                        lines.append(Line(textblock.get(XML_ID), str(n), text, attributes.labels(textline_element, None)["type"],
+                                          tb.attributes["type"], textblock.get(XML_ID), surface.get(XML_ID)))
+            continue
+
+        # -- TEXTLINE --
+        # "tl" concerns <TextLine> and its descendant <Polygon>
+        for textline_element, lines_on_page, text in textlines:
+            tl = attributes.zone(textline_element, segmonto_lines)
+            textline = surface_tree.zone2(textblock, tl.attributes, tl.id, lines_on_page)
+            if text is None:
+                continue
+
+            # If the line's textual content is expressed at the level of glyphs, map its segments and glyphs to <zone> elements.
+            if finest >= STRING and len(alto_page.first(textline_element, "String")) > 0:
+                # Loop through all the <String> or <SP> children of a <TextLine>
+                for textline_child in alto_page.children(textline_element):
+                    name = alto_page.name(textline_child)
+                    if name != "SP" and name != "String":
+                        continue
+                    string_data = attributes.zone(textline_child, None)
+                    strings_on_page+=1
+                    string = surface_tree.zone3(textline, string_data.attributes, string_data.id, strings_on_page)
+                    if name == "SP" or finest < GLYPH:
+                        continue
+
+                    # Loop through all the <Glyph> children of a <String>
+                    for glyph_child in alto_page.children(textline_child, "Glyph"):
+                        glyph_id = glyph_child.attrib["ID"]
+                        glyph_data = attributes.zone(glyph_child, None)
+                        glyphs_on_page+=1
+                        glyph = surface_tree.zone4(string, glyph_data.attributes, glyph_id, glyphs_on_page)
+                        surface_tree.car(glyph, glyph_child, glyph_id)
+
+            # Map the line's text to the TEI element <line>.
+            surface_tree.line(textline, lines_on_page, text)
+            if lines is not None:
+                lines.append(Line(surface_tree.ids.line_zone, str(lines_on_page), text, tl.attributes["type"],
+                                  tb.attributes["type"], textblock.get(XML_ID), surface.get(XML_ID)))
+
+    metrics.count("blocks", blocks_on_page)
+    metrics.count("lines", lines_on_page)
+    metrics.count("strings", strings_on_page)
+    metrics.count("glyphs", glyphs_on_page)
+    return surface
+
+def serialized_surface(document_name, segmonto_zones, segmonto_lines, config, granularity, record, with_lines, file):
+    """Parse one ALTO file and return its <surface> serialized, so that pages can be built in worker processes.
+        If record is True, the page's spans and counters are recorded in the worker process and returned with it;
+        if with_lines is True, so is the data of its text lines.
+    Returns:
+        (bytes): the page's <surface> as XML
+        (dict): the page's metrics record (see metrics.Recorder.record()), or None
+        (list): the Line of each of the page's text lines, or None
+    """
+    lines = [] if with_lines else None
+    if record:
+        metrics.start(document_name)
+    with metrics.span("surface", file.filepath.name):
+        pages = PageCache([file.filepath])
+        surface_group = etree.Element("sourceDoc")
+        surface = page_surface(surface_group, document_name, file, pages.labels(file.filepath), segmonto_zones, segmonto_lines, config, pages.page(file.filepath), granularity, lines)
+    return etree.tostring(surface), metrics.finish(), lines
+
+
+def stored_lines(document_name, file, config, pages, surface, granularity):
+    """Return the data of the text lines of a page whose <surface> was taken from the last build:
+        from its <line> elements, or, if it has none (block granularity), from the ALTO file.
+    """
+    if depth(granularity) >= LINE:
+        return Text(surface).data
+    return page_lines(document_name, file, pages.labels(file.filepath), config, pages.page(file.filepath), line_zones=False)
+
+
+def surfaces(surface_group, document_name, filepath_list, segmonto_zones, segmonto_lines, config, pages=None, jobs=1, manifest=None, granularity="glyph", lines=None):
+    """Creates the <surface> of each ALTO file inside the given <sourceDoc>, in folio order, and yields each one as soon as it is built.
+        If a PageCache is given, the ALTO files already parsed by an earlier step (eg. the <teiHeader>) are reused.
+        If jobs is greater than 1, the pages' <surface> elements are built in that many worker processes.
+        If a Manifest is given, the <surface> of every unchanged ALTO file is taken from the last build
+        and only the other files are parsed; the <surface> of each of those is stored for the next build.
+        The granularity (one of GRANULARITIES) is the level of the finest zones of each <surface>.
+        If a list of lines is given, the Line of every <line> is appended to it, in document order, for the <body>.
+    """
+    depth(granularity)
+    if pages is None:
+        pages = PageCache(filepath_list)
 
+    ordered_files = Files(document_name, filepath_list).order_files()
 
-def labels(filepath):
-    root = etree.parse(filepath).getroot()
-    elements = [t.attrib for t in root.findall('.//a:OtherTag', namespaces=NS)]
-    collect = defaultdict(dict)
-    for d in elements:
-        collect[d["ID"]] = d["LABEL"]
-    tags = dict(collect)
-    return tags
+    stored = set()
+    if manifest:
+        manifest.use_surfaces(segmonto_zones, segmonto_lines, config, granularity)
+        stored = {file.filepath for file in ordered_files if manifest.has_surface(file.filepath)}
+    to_build = [file for file in ordered_files if file.filepath not in stored]
+
+    with ExitStack() as stack:
+        if jobs > 1 and to_build:
+            # Build the pages in worker processes; map() returns the serialized <surface> elements in folio order,
+            # with the spans and counters of each page if the document is being recorded, and the data of its lines if asked for.
+            build = partial(serialized_surface, document_name, segmonto_zones, segmonto_lines, config, granularity,
+                            metrics.recorder is not None, lines is not None)
+            from concurrent.futures import ProcessPoolExecutor  # only loaded when pages are built in worker processes
+            pool = stack.enter_context(ProcessPoolExecutor(max_workers=jobs))
+            fragments = pool.map(build, to_build)
+
+        for file in ordered_files:
+            if jobs > 1 and file.filepath not in stored:
+                fragment, record, fragment_lines = next(fragments)
+                surface = etree.fromstring(fragment, SURFACE_PARSER)
+                surface_group.append(surface)
+                metrics.merge(record)
+                if lines is not None:
+                    lines.extend(fragment_lines)
+            elif file.filepath in stored:
+                with metrics.span("surface", file.filepath.name):
+                    surface = manifest.surface(file.filepath)
+                    surface_group.append(surface)
+                metrics.count("surfaces_reused")
+                if lines is not None:
+                    lines.extend(stored_lines(document_name, file, config, pages, surface, granularity))
+            else:
+                with metrics.span("surface", file.filepath.name):
+                    surface = page_surface(surface_group, document_name, file, pages.labels(file.filepath), segmonto_zones, segmonto_lines, config, pages.page(file.filepath), granularity, lines)
+
+            # No later step needs the ALTO file's tree
+            pages.release(file.filepath)
+            if manifest and file.filepath not in stored:
+                manifest.store_surface(file.filepath, etree.tostring(surface))
+            yield surface
+
+
+def surface_lines(pages, lines):
+    """Yield the Line of each text line of a document, each page's lines as soon as the page is built.
+    Args:
+        pages (generator): surfaces(), which appends the Line of each line of a page to lines
+        lines (list): the list given to surfaces(), emptied after each page
+    Yields:
+        (Line): data of the next text line, in document order
+    """
+    for surface in pages:
+        yield from lines
+        lines.clear()
 
 
-def sourcedoc(document_name, output_tei_root, filepath_list, tags, segmonto_zones, segmonto_lines, config):
+def sourcedoc(document_name, output_tei_root, filepath_list, tags, segmonto_zones, segmonto_lines, config, pages=None, jobs=1, manifest=None, granularity="glyph", lines=None):
     """Creates the <sourceDoc> for an XML-TEI file using data parsed from a series of ALTO files.
         The <sourceDoc> collates each ALTO file, which represents one page of a document, into a wholistic
         description of the document.
+        If a PageCache is given, the ALTO files already parsed by an earlier step (eg. the <teiHeader>) are reused.
+        If jobs is greater than 1, the pages' <surface> elements are built in that many worker processes.
+        If a Manifest is given, only the ALTO files that changed since the last build are parsed.
+        The granularity (one of GRANULARITIES) is the level of the finest zones of each <surface>.
+        If a list of lines is given, the Line of every <line> is appended to it, for the <body>.
     """
-
-
-    ordered_files = Files(document_name, filepath_list).order_files()
     
-    # Create <sourceDoc> and its child <surfaceGrp>.
+    # Create <sourceDoc> and a <surface> for every page.
     sourceDoc = etree.SubElement(output_tei_root, "sourceDoc")
+    for surface in surfaces(sourceDoc, document_name, filepath_list, segmonto_zones, segmonto_lines, config, pages, jobs, manifest, granularity, lines):
+        pass
 
-    for file in ordered_files:
-
-        tags = labels(file.filepath)
-
-        # Start count at 0 for number of entities on a page.
-        blocks_on_page = 0
-        lines_on_page = 0
-        strings_on_page = 0
-        glyphs_on_page = 0
-
-        # Parse the XML tree for the ALTO file
-        input_alto_root = etree.parse(file.filepath).getroot()
-        # Instantiate the classes Attributes and SurfaceTree for the ALTO file
-        attributes = Attributes(document_name, file.num, input_alto_root, tags, config)
-        surface_tree = SurfaceTree(document_name, file.num, input_alto_root)
-
-        # -- SURFACE --
-        # For every page in the ALTO file, create a <surface> and assign its attributes.
-        surface = surface_tree.surface(sourceDoc, attributes.surface())
-
-        # -- TEXTBLOCK --
-        # For every <TextBlock> in a <PrintSpace>, create a <zone> and assign it attributes.
-        textblocks = attributes.zones("PrintSpace", "TextBlock", segmonto_zones)
-        for tb in textblocks:
-            # Only map the <TextBlock> to the XML-TEI tree if its @ID was found.
-            if tb.id:
-                blocks_on_page+=1
-                textblock = surface_tree.zone1(surface, tb.attributes, tb.id, blocks_on_page)
-
-            textlines = attributes.zones(f'TextBlock[@ID="{tb.id}"]', "TextLine", segmonto_lines)
-            # "tl" concerns <TextLine> and its descendant <Polygon>
-            for tl in textlines:
-                # Only map the <TextLine> to the XML-TEI tree if its @ID was found.
-                if tl.id:
-                    lines_on_page+=1
-                    textline = surface_tree.zone2(textblock, tb.id, tl.attributes, tl.id, lines_on_page)
-                    words = ""
-
-                    # If <TextLine> has child <String> that has all the line's textual content, map that to the TEI element <line>.
-                    if input_alto_root.find(f'.//a:TextLine[@ID="{tl.id}"]/a:String', namespaces=NS).get("CONTENT") is not None\
-                        and len(input_alto_root.find(f'.//a:TextLine[@ID="{tl.id}"]/a:String', namespaces=NS).getchildren()) == 0:
-                        # Map the textual data to the TEI element <line>.
-                        surface_tree.line(textline, tb.id, tl.id, lines_on_page, None)
-                    
-                    # If the line's textual content is expressed at the level of glyphs, map that textual data to TEI element <c>.
-                    elif input_alto_root.find(f'.//a:TextLine[@ID="{tl.id}"]/a:String', namespaces=NS).get("CONTENT") is not None\
-                        and input_alto_root.find(f'.//a:TextLine[@ID="{tl.id}"]/a:String', namespaces=NS).get("CONTENT") != ""\
-                        and len(input_alto_root.find(f'.//a:TextLine[@ID="{tl.id}"]/a:String', namespaces=NS).getchildren()) > 0:
-
-                        # Loop through all the <String> or <SP> children of a <TextLine>
-                        textline_children = input_alto_root.find(f'.//a:TextLine[@ID="{tl.id}"]', namespaces=NS).getchildren()
-                        for textline_child in textline_children:
-
-                            # If child of <TextLine> is a space <SP>
-                            if etree.QName(textline_child).localname == "SP":
-                                textline_child_id = textline_child.attrib["ID"]
-                                space_data = attributes.zones(f'TextLine[@ID="{tl.id}"]', f'SP[@ID="{textline_child_id}"]', None)[0]
-                                strings_on_page+=1
-                                surface_tree.zone3(textline, tb.id, tl.id, space_data.attributes, space_data.id, strings_on_page)
-
-                            # If a child of <TextLine> is a segment of text <String>
-                            elif etree.QName(textline_child).localname == "String":
-                                textline_child_id = textline_child.attrib["ID"]
-                                string_data = attributes.zones(f'TextLine[@ID="{tl.id}"]', f'String[@ID="{textline_child_id}"]', None)[0]
-                                strings_on_page+=1
-                                string = surface_tree.zone3(textline, tb.id, tl.id, string_data.attributes, string_data.id, strings_on_page)
-
-                                # Loop through all the <Glyph> children of a <String>
-                                string_children = input_alto_root.findall(f'.//a:String[@ID="{textline_child_id}"]/a:Glyph', namespaces=NS)
-                                if words == "":
-                                    words = words + "".join([g.get("CONTENT") for g in string_children])
-                                else:
-                                    words = words + " " + "".join([g.get("CONTENT") for g in string_children])
-                                    
-                                for glyph_child in string_children:
-                                    glyph_id = glyph_child.attrib["ID"]
-                                    glyph_data = attributes.zones(f'String[@ID="{textline_child_id}"]', f'Glyph[@ID="{glyph_id}"]', None)[0]
-                                    glyphs_on_page+=1
-                                    glyph = surface_tree.zone4(string, tb.id, tl.id, textline_child_id, glyph_data.attributes, glyph_id, glyphs_on_page)
-                                    surface_tree.car(glyph, glyph_child, tb.id, tl.id, textline_child_id, glyph_id, glyphs_on_page)
-
-                        surface_tree.line(textline, tb.id, tl.id, lines_on_page, words)
-  
     return output_tei_root
-    
\ No newline at end of file
@@ -4,19 +4,38 @@
 # -----------------------------------------------------------
 
 from lxml import etree
-import re
+from src.coordinates import tei_points
 
-NS = {'a':"http://www.loc.gov/standards/alto/ns-v4#"}  # namespace for the Alto xml
+XML_ID = "{http://www.w3.org/XML/1998/namespace}id"
+
+
+class ZoneIds:
+    """Prefixes of the xml:ids of one page's zones, each made once from its parent's as the <surface> is built,
+        eg. "f12-eSc_textblock_3" for a text block, then "f12-eSc_textblock_3-eSc_line_7" for one of its lines.
+    """
+    __slots__ = ("page", "block", "line", "line_zone", "segment", "glyph_zone")
+
+    def __init__(self, folio):
+        self.page = f"f{folio}"
+        self.block = None  # prefix of the current text block's zones
+        self.line = None  # prefix of the current line's zones
+        self.line_zone = None  # xml:id of the current line's <zone>
+        self.segment = None  # prefix of the current segment's zones
+        self.glyph_zone = None  # xml:id of the current glyph's <zone>
 
 
 class SurfaceTree:
     """Creates a <surface> element and its children for one page (ALTO file) of a document.
+        The xml:id of each zone is made from the prefix of its parent, kept in self.ids, and every element
+        is created with all its attributes at once.
     """    
     
-    def __init__(self, doc, folio, alto_root):
+    def __init__(self, doc, folio, alto_page):
         self.doc = doc
         self.folio = folio
-        self.root = alto_root
+        self.page = alto_page  # (AltoPage) index of the ALTO file's layout elements
+        self.root = alto_page.root
+        self.ids = ZoneIds(folio)  # (ZoneIds) prefixes of the xml:ids of the zones being built
 
     def surface(self, surface_group, page_attributes):
         """Make the TEI <surface> element that will organize all of an ALTO file's data.
@@ -34,149 +53,103 @@ class SurfaceTree:
         return surface
 
     def zone1(self, surface, attributes, block_id, blocks_on_page):
-        """Make the xml:id and TEI <zone> element for the ALTO file's <TextBlock>.
+        """Make the xml:id and TEI <zone> element for the ALTO file's <TextBlock>, and start the prefix of its lines' xml:ids.
 
         Args:
-            surface (etree_Element): _description_
-            textblock_atts (dict): _description_
-            block_id (str): _description_
-            blocks_on_page (int): _description_
+            surface (etree_Element): the page's <surface>
+            attributes (dict): attributes of the text block's <zone>
+            block_id (str): @ID of the <TextBlock>
+            blocks_on_page (int): number of the text block on the page
 
         Returns:
-            _type_: _description_
+            zone (etree_Element): the text block's <zone>
         """        
-        xml_id = {"{http://www.w3.org/XML/1998/namespace}id":f"f{self.folio}-{block_id}-blockCount{blocks_on_page}"}
-        zone = etree.SubElement(surface, "zone", xml_id)
-        for k,v in attributes.items():
-            zone.attrib[k]=v
-        return zone
+        self.ids.block = f"{self.ids.page}-{block_id}"
+        return etree.SubElement(surface, "zone", {XML_ID:f"{self.ids.block}-blockCount{blocks_on_page}", **attributes})
 
-    def zone2(self, textblock, block_parent, attributes, line_id, lines_on_page):   
+    def zone2(self, textblock, attributes, line_id, lines_on_page):   
         """Make the xml:id and TEI <zone> element for the second-level <zone> for the ALTO file's <TextLine>
             and make the xml:id for the second-level <zone>'s <path>.
 
         Args:
-            textblock (_type_): _description_
-            block_parent (_type_): _description_
-            textline_atts (_type_): _description_
-            line_id (_type_): _description_
-            lines_on_page (_type_): _description_
+            textblock (etree_Element): the text block's <zone>
+            attributes (dict): attributes of the line's <zone>
+            line_id (str): @ID of the <TextLine>
+            lines_on_page (int): number of the line on the page
 
         Returns:
-            _type_: _description_
+            zone (etree_Element): the line's <zone>
         """         
-        # -------------------------------------------
-        zone_id = {"{http://www.w3.org/XML/1998/namespace}id":f"f{self.folio}-{block_parent}-{line_id}-lineCount{lines_on_page}"}
-        # Insert the <zone> with this xml:id into the TEI-XML tree.
-        zone = etree.SubElement(textblock, "zone", zone_id)
-        # Insert the 
-        for k,v in attributes.items():
-            zone.attrib[k]=v
-        # -------------------------------------------
-        path_id = {"{http://www.w3.org/XML/1998/namespace}id":f"f{self.folio}-{block_parent}-{line_id}-lineCount{lines_on_page}-baseline"}
-        #
-        baseline = etree.SubElement(zone, "path", path_id)
-        #
-        b = self.root.find(f'.//a:TextLine[@ID="{line_id}"]', namespaces=NS).get("BASELINE")
-        #
-        baseline.attrib["points"] = " ".join([re.sub(r"\s", ",", x) for x in re.findall(r"(\d+ \d+)", b)])
+        self.ids.line = f"{self.ids.block}-{line_id}"
+        self.ids.line_zone = f"{self.ids.line}-lineCount{lines_on_page}"
+        # Insert the <zone> with this xml:id into the TEI-XML tree, followed by the <path> of the line's baseline.
+        zone = etree.SubElement(textblock, "zone", {XML_ID:self.ids.line_zone, **attributes})
+        b = self.page.element(line_id, "TextLine").get("BASELINE")
+        etree.SubElement(zone, "path", {XML_ID:f"{self.ids.line_zone}-baseline", "points":tei_points(b)})
         return zone
 
-    def line(self, textline, block_parent, line_parent, lines_on_page, extracted_words):
-        """If the ALTO file stores all of a line's textual data in the <TextLine> attribute @CONTENT, 
-            make the xml:id for <line>.
+    def line(self, textline, lines_on_page, text):
+        """Make the <line> of the line's <zone>, with the line's text (see text_data.line_text()).
 
         Args:
-            textline (_type_): _description_
-            block_parent (_type_): _description_
-            line_parent (_type_): _description_
-            lines_on_page (_type_): _description_
+            textline (etree_Element): the line's <zone>
+            lines_on_page (int): number of the line on the page
+            text (str): text of the line
 
         Returns:
-            _type_: _description_
+            line (etree_Element): the <line>
         """        
-        xml_id = {"{http://www.w3.org/XML/1998/namespace}id":f"f{self.folio}-{block_parent}-{line_parent}-lineCount{lines_on_page}-text"}
-        # If the 
-        line = etree.SubElement(textline, "line", xml_id)
-        line.attrib["n"] = str(lines_on_page)
-        if extracted_words:
-            line.text = extracted_words
-        else:
-            line.text = self.root.find(f'.//a:TextLine[@ID="{line_parent}"]/a:String', namespaces=NS).get("CONTENT")
+        line = etree.SubElement(textline, "line", {XML_ID:f"{self.ids.line_zone}-text", "n":str(lines_on_page)})
+        line.text = text
         return line
         
-    def zone3(self, textline, block_parent, line_parent, attributes, seg_id, strings_on_page):
-        """Make the xml:id and TEI <zone> element for the ALTO file's <String> (segment/word).
+    def zone3(self, textline, attributes, seg_id, strings_on_page):
+        """Make the xml:id and TEI <zone> element for the ALTO file's <String> (segment/word) or <SP>,
+            and start the prefix of its glyphs' xml:ids.
 
         Args:
-            textline (_type_): _description_
-            block_parent (_type_): _description_
-            line_parent (_type_): _description_
-            attributes (_type_): _description_
-            seg_id (_type_): _description_
-            segments_on_page (_type_): _description_
+            textline (etree_Element): the line's <zone>
+            attributes (dict): attributes of the segment's <zone>
+            seg_id (str): @ID of the <String> or <SP>
+            strings_on_page (int): number of the segment on the page
 
         Returns:
-            _type_: _description_
+            zone (etree_Element): the segment's <zone>
         """        
-        xml_id = {"{http://www.w3.org/XML/1998/namespace}id":f"f{self.folio}-{block_parent}-{line_parent}-{seg_id}-segCount{strings_on_page}"}
-        zone = etree.SubElement(textline, "zone", xml_id)
-        for k,v in attributes.items():
-            zone.attrib[k]=v
-
-        if self.root.find(f'.//a:String[@ID="{seg_id}"]', namespaces=NS) is not None \
-            and self.root.find(f'.//a:String[@ID="{seg_id}"]', namespaces=NS).get("WC") is not None:
-            word_certainty = self.root.find(f'.//a:String[@ID="{seg_id}"]', namespaces=NS).get("WC")
-            cert_attribs = {
-                "{http://www.w3.org/XML/1998/namespace}id":f"f{self.folio}-{block_parent}-{line_parent}-{seg_id}-segCount{strings_on_page}-cert",
-                "target":f"#f{self.folio}-{block_parent}-{line_parent}-{seg_id}-segCount{strings_on_page}-text",
-                "locus":"value",
-                "degree":word_certainty
-            }
-            etree.SubElement(zone, "certainty", cert_attribs)
+        self.ids.segment = f"{self.ids.line}-{seg_id}"
+        xml_id = f"{self.ids.segment}-segCount{strings_on_page}"
+        zone = etree.SubElement(textline, "zone", {XML_ID:xml_id, **attributes})
+
+        segment = self.page.element(seg_id, "String")
+        if segment is not None and segment.get("WC") is not None:
+            etree.SubElement(zone, "certainty", {XML_ID:f"{xml_id}-cert", "target":f"#{xml_id}-text", "locus":"value", "degree":segment.get("WC")})
         return zone
 
-    def zone4(self, string, block_parent, line_parent, seg_parent, attributes, glyph_id, glyphs_on_page):
-        """Make the xml:id and TEI <zone> element for the ALTO file's <String> (segment/word).
+    def zone4(self, string, attributes, glyph_id, glyphs_on_page):
+        """Make the xml:id and TEI <zone> element for the ALTO file's <Glyph>.
 
         Args:
-            textline (_type_): _description_
-            block_parent (_type_): _description_
-            line_parent (_type_): _description_
-            attributes (_type_): _description_
-            seg_id (_type_): _description_
-            segments_on_page (_type_): _description_
+            string (etree_Element): the segment's <zone>
+            attributes (dict): attributes of the glyph's <zone>
+            glyph_id (str): @ID of the <Glyph>
+            glyphs_on_page (int): number of the glyph on the page
 
         Returns:
-            _type_: _description_
+            zone (etree_Element): the glyph's <zone>
         """        
-        xml_id = {"{http://www.w3.org/XML/1998/namespace}id":f"f{self.folio}-{block_parent}-{line_parent}-{seg_parent}-{glyph_id}-glyphCount{glyphs_on_page}"}
-        zone = etree.SubElement(string, "zone", xml_id)
-        for k,v in attributes.items():
-            zone.attrib[k]=v
-
-        if self.root.find(f'.//a:Glyph[@ID="{glyph_id}"]', namespaces=NS).get("GC") is not None:
-            glyph_certainty = self.root.find(f'.//a:Glyph[@ID="{glyph_id}"]', namespaces=NS).get("GC")
-            cert_attribs = {
-                "{http://www.w3.org/XML/1998/namespace}id":f"f{self.folio}-{block_parent}-{line_parent}-{seg_parent}-{glyph_id}-glyphCount{glyphs_on_page}-cert",
-                "target":f"#f{self.folio}-{block_parent}-{line_parent}-{seg_parent}-{glyph_id}-glyphCount{glyphs_on_page}-text",
-                "locus":"value",
-                "degree":glyph_certainty
-            }
-            etree.SubElement(zone, "certainty", cert_attribs)
+        self.ids.glyph_zone = f"{self.ids.segment}-{glyph_id}-glyphCount{glyphs_on_page}"
+        zone = etree.SubElement(string, "zone", {XML_ID:self.ids.glyph_zone, **attributes})
+
+        glyph = self.page.element(glyph_id, "Glyph")
+        if glyph.get("GC") is not None:
+            etree.SubElement(zone, "certainty", {XML_ID:f"{self.ids.glyph_zone}-cert", "target":f"#{self.ids.glyph_zone}-text",
+                                                 "locus":"value", "degree":glyph.get("GC")})
         return zone
 
-    def car(self, zone,  glyph, block_parent, line_parent, seg_parent, glyph_id, glyphs_on_page):     
-        xml_id = {"{http://www.w3.org/XML/1998/namespace}id":f"f{self.folio}-{block_parent}-{line_parent}-{seg_parent}-{glyph_id}-glyphCount{glyphs_on_page}-text"}
-        car = etree.SubElement(zone, "c", xml_id)
-        if self.root.find(f'.//a:Glyph[@ID="{glyph_id}"]', namespaces=NS).get("WC") is not None:
-            word_certainty = self.root.find(f'.//a:Glyph[@ID="{glyph_id}"]', namespaces=NS).get("WC")
-            cert_attribs = {
-                "{http://www.w3.org/XML/1998/namespace}id":f"f{self.folio}-{block_parent}-{line_parent}-{seg_parent}-{glyph_id}-glyphCount{glyphs_on_page}-cert",
-                "locus":"value",
-                "degree":word_certainty
-            }
-            etree.SubElement(zone, "certainty", cert_attribs)
+    def car(self, zone, glyph, glyph_id):     
+        car = etree.SubElement(zone, "c", {XML_ID:f"{self.ids.glyph_zone}-text"})
+        word_certainty = self.page.element(glyph_id, "Glyph").get("WC")
+        if word_certainty is not None:
+            etree.SubElement(zone, "certainty", {XML_ID:f"{self.ids.glyph_zone}-cert", "locus":"value", "degree":word_certainty})
         car.text = glyph.attrib["CONTENT"]
         return car
-
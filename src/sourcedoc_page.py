@@ -0,0 +1,102 @@
+# -----------------------------------------------------------
+# Code by: Kelly Christensen
+# Python class to index the layout elements of an ALTO file in a single traversal.
+# -----------------------------------------------------------
+
+import re
+from collections import defaultdict
+
+ALTO = "http://www.loc.gov/standards/alto/ns-v4#"  # namespace for the Alto xml
+LAYOUT = ["Page", "PrintSpace", "TextBlock", "TextLine", "String", "SP", "Glyph"]
+LOCALNAMES = {f"{{{ALTO}}}{name}":name for name in LAYOUT}
+
+# selectors of the form 'TextBlock' or 'TextBlock[@ID="eSc_textblock_20c2f4d8"]'
+SELECTOR = re.compile(r'(\w+)(?:\[@ID="([^"]*)"\])?$')
+
+
+class AltoPage:
+    """Index of the layout elements (Page, PrintSpace, TextBlock, TextLine, String, SP, Glyph) of one ALTO file.
+        The tree is walked once; afterwards every element is found by its @ID and every parent / child
+        is reached without searching the page again.
+    """
+
+    def __init__(self, alto_root):
+        self.root = alto_root
+        self.page = None
+        self.ids = {}  # (dict) @ID -> element, first occurrence in document order
+        self.parents = {}  # (dict) element -> parent layout element
+        self.kids = defaultdict(list)  # (dict) element -> list of child layout elements in document order
+        self.by_name = defaultdict(list)  # (dict) local name -> list of elements in document order
+
+        for element in alto_root.iter(*LOCALNAMES):
+            name = LOCALNAMES[element.tag]
+            parent = element.getparent()
+            self.parents[element] = parent
+            self.kids[parent].append(element)
+            self.by_name[name].append(element)
+            if "ID" in element.attrib:
+                self.ids.setdefault(element.attrib["ID"], element)
+            if self.page is None and name == "Page":
+                self.page = element
+
+    def name(self, element):
+        """Return the local name of a layout element, eg. 'TextLine'.
+        """
+        return LOCALNAMES.get(element.tag)
+
+    def element(self, id, name=None):
+        """Return the layout element with the given @ID, or None if it does not exist or is not of the expected type.
+        Args:
+            id (str): value of the element's @ID
+            name (str): expected local name of the element, eg. 'Glyph'
+        """
+        element = self.ids.get(id)
+        if element is not None and name is not None and LOCALNAMES[element.tag] != name:
+            return None
+        return element
+
+    def parent(self, element):
+        return self.parents.get(element)
+
+    def children(self, element, name=None):
+        """Return the child layout elements of an element in document order, optionally only those with a given local name.
+        """
+        if name is None:
+            return self.kids.get(element, [])
+        return [c for c in self.kids.get(element, []) if LOCALNAMES[c.tag] == name]
+
+    def first(self, element, name):
+        """Return the first child of an element with the given local name, or None.
+        """
+        for c in self.kids.get(element, []):
+            if LOCALNAMES[c.tag] == name:
+                return c
+        return None
+
+    def select(self, parent, target):
+        """Resolve the pair of selectors used by text_blocks() to a list of elements,
+            equivalent to the path './/a:{parent}/a:{target}'.
+        Args:
+            parent (str): eg. 'PrintSpace' or 'TextBlock[@ID="eSc_textblock_20c2f4d8"]'
+            target (str): eg. 'TextLine' or 'Glyph[@ID="eSc_glyph_1b2c"]'
+        Returns:
+            (list): matching elements in document order
+        """
+        parent_name, parent_id = SELECTOR.match(parent).groups()
+        target_name, target_id = SELECTOR.match(target).groups()
+
+        if target_id is not None:
+            element = self.element(target_id, target_name)
+            if element is None:
+                return []
+            owner = self.parents[element]
+            if owner is None or LOCALNAMES.get(owner.tag) != parent_name \
+                or (parent_id is not None and owner.get("ID") != parent_id):
+                return []
+            return [element]
+
+        if parent_id is not None:
+            parents = [self.element(parent_id, parent_name)]
+        else:
+            parents = self.by_name[parent_name]
+        return [c for p in parents if p is not None for c in self.children(p, target_name)]
@@ -0,0 +1,97 @@
+# -----------------------------------------------------------
+# Code by: Kelly Christensen
+# Python functions to read an ALTO file incrementally, without keeping its whole tree in memory.
+# -----------------------------------------------------------
+
+import os
+from collections import namedtuple
+from contextlib import nullcontext
+from lxml import etree
+from src import metrics
+
+ALTO = "http://www.loc.gov/standards/alto/ns-v4#"  # namespace for the Alto xml
+OTHERTAG = f"{{{ALTO}}}OtherTag"
+TAGS = f"{{{ALTO}}}Tags"
+LAYOUT = f"{{{ALTO}}}Layout"
+POLYGON = f"{{{ALTO}}}Polygon"
+CHUNK = 4096  # bytes read at a time when looking for the <Tags>
+RECORDS = ["TextBlock", "TextLine", "String", "SP", "Glyph"]
+CONTAINERS = ["ComposedBlock"]  # layout elements that are not read but whose @ID is given as the parent of their children
+
+Record = namedtuple("Record", ["name", "id", "attributes", "points", "parent", "children"])
+
+
+def read_tags(filepath):
+    """Map the @ID of every <OtherTag> in an ALTO file to its @LABEL, reading the file only until the end of its <Tags>.
+    Args:
+        filepath (str): path to the ALTO file, or the file already opened in binary mode (eg. io.BytesIO)
+    Returns:
+        tags (dict): {tag ID (str): label (str)}
+    """
+    tags = {}
+    # <OtherTag> and <Tags> are read when they end, so that their attributes and children are complete;
+    # <Layout> when it starts, so that a file without <Tags> is not read any further
+    parser = etree.XMLPullParser(events=("start", "end"), tag=(OTHERTAG, TAGS, LAYOUT))
+    with open(filepath, "rb") if isinstance(filepath, (str, os.PathLike)) else nullcontext(filepath) as f:
+        for chunk in iter(lambda: f.read(CHUNK), b""):
+            metrics.count("bytes_read", len(chunk))
+            parser.feed(chunk)
+            for event, element in parser.read_events():
+                if element.tag == OTHERTAG:
+                    if event == "end":
+                        tags[element.attrib["ID"]] = element.attrib["LABEL"]
+                elif element.tag == LAYOUT or event == "end":
+                    # the tag table is complete once <Tags> is closed, or once the <Layout> is reached without one
+                    return tags
+    return tags
+
+
+
+def records(filepath, names=RECORDS):
+    """Read the layout elements of an ALTO file in document order, one at a time.
+        Each element is given as a Record once its own attributes and <Shape> have been read, before its children;
+        elements are cleared from memory as soon as they are closed.
+    Args:
+        filepath (str): path to the ALTO file, or the file already opened in binary mode (eg. io.BytesIO)
+        names (list): local names of the elements to read, eg. ["TextBlock", "TextLine"] for a line-level pass
+    Yields:
+        (Record): local name, @ID, attributes (dict), Polygon/@POINTS (str or None), @ID of the parent layout element,
+                  and whether the element has any child element (eg. a <Shape> or a <Glyph>)
+    """
+    wanted = {f"{{{ALTO}}}{name}":name for name in names}
+    every = {f"{{{ALTO}}}{name}":name for name in RECORDS + CONTAINERS}
+    pending = None  # record of the last opened element, given once its <Shape> has been read
+    ancestors = []  # @ID of the open layout elements
+    with open(filepath, "rb") if isinstance(filepath, (str, os.PathLike)) else nullcontext(filepath) as f:
+        try:
+            for event, element in etree.iterparse(f, events=("start", "end")):
+                tag = element.tag
+                if event == "start":
+                    if pending and not pending.children:
+                        pending = pending._replace(children=True)
+                    if tag in every:
+                        # a layout child closes the description of its parent
+                        if pending:
+                            yield pending
+                            pending = None
+                        if tag in wanted:
+                            parent = ancestors[-1] if ancestors else None
+                            pending = Record(wanted[tag], element.get("ID"), dict(element.attrib), None, parent, False)
+                        ancestors.append(element.get("ID"))
+
+                elif tag == POLYGON:
+                    # while a record is pending, the only <Polygon> that can be read is the one of its own <Shape>
+                    if pending and pending.points is None:
+                        pending = pending._replace(points=element.get("POINTS"))
+
+                elif tag in every:
+                    if pending:
+                        yield pending
+                        pending = None
+                    ancestors.pop()
+                    # free the element and everything that was read before it
+                    element.clear(keep_tail=True)
+                    while element.getprevious() is not None:
+                        del element.getparent()[0]
+        finally:
+            metrics.count("bytes_read", f.tell())
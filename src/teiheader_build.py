@@ -9,12 +9,13 @@ from src.teiheader_full import FullTree
 NS = {"s":"http://www.loc.gov/zing/srw/", "m":"info:lc/xmlns/marcxchange-v2"}
 
 
-def teiheader(metadata, document, root, count_pages, config, version, filepaths, segmonto_zones, segmonto_lines):
+def teiheader(metadata, document, root, count_pages, config, version, pages, segmonto_zones, segmonto_lines):
     """Create all elements of the <teiHeader>.
     Args:
         document (str): name of directory containing ALTO-encoded transcriptions of the document's pages
         root (etree): XML-TEI tree
         count_pages (string): number of files in directory
+        pages (PageCache): parsed ALTO files of the document
     Returns:
         root (etree): XML-TEI tree
     """    
@@ -27,5 +28,5 @@ def teiheader(metadata, document, root, count_pages, config, version, filepaths,
     htree = FullTree(elements.children, metadata)  # full_teiheader.py
     htree.author_data()
     htree.bib_data()
-    segmonto_zones, segmonto_lines = htree.segmonto_taxonomy(filepaths)
+    segmonto_zones, segmonto_lines = htree.segmonto_taxonomy(pages)
     return root, segmonto_zones, segmonto_lines
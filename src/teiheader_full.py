@@ -6,7 +6,34 @@
 from lxml import etree
 import re
 from collections import namedtuple
-from .sourcedoc_build import labels
+
+# All the SegmOnto tags and a URL pointing to their description, built once when the module is imported.
+SEGMONTO_ZONES = {
+    "CustomZone":"https://segmonto.github.io/gd/gdZ/CustomZone/",
+    "DamageZone":"https://segmonto.github.io/gd/gdZ/DamageZone",
+    "DecorationZone":"https://segmonto.github.io/gd/gdZ/DecorationZone",
+    "DigitizationArtefactzone":"https://segmonto.github.io/gd/gdZ/DigitizationArtefactzone",
+    "DropCapitalZone":"https://segmonto.github.io/gd/gdZ/DropCapitalZone",
+    "MainZone":"https://segmonto.github.io/gd/gdZ/MainZone",
+    "MusicZone":"https://segmonto.github.io/gd/gdZ/MusicZone",
+    "NumberingZone":"https://segmonto.github.io/gd/gdZ/NumberingZone",
+    "QuireMarksZone":"https://segmonto.github.io/gd/gdZ/QuireMarksZone",
+    "RunningTitleZone":"https://segmonto.github.io/gd/gdZ/RunningTitleZone",
+    "SealZone":"https://segmonto.github.io/gd/gdZ/SealZone",
+    "StampZone":"https://segmonto.github.io/gd/gdZ/StampZone",
+    "TableZone":"https://segmonto.github.io/gd/gdZ/TableZone",
+    "TitlePageZone":"https://segmonto.github.io/gd/gdZ/TitlePageZone"
+}
+SEGMONTO_LINES = {
+    "CustomLine":"https://segmonto.github.io/gd/gdL/CustomLine/",
+    "DefaultLine":"https://segmonto.github.io/gd/gdL/DefaultLine",
+    "DropCapitalLine":"https://segmonto.github.io/gd/gdL/DropCapitalLine",
+    "HeadingLine":"https://segmonto.github.io/gd/gdL/HeadingLine",
+    "InterlinearLine":"https://segmonto.github.io/gd/gdL/InterlinearLine",
+    "MusicLine":"https://segmonto.github.io/gd/gdL/MusicLine"
+}
+LABEL = re.compile(r"(\w+):?(\w+)?#?(\d?)?")  # main part of a SegmOnto label (string before a colon, if present)
+
 
 class FullTree:
     def __init__(self, children, metadata):
@@ -120,39 +147,13 @@ class FullTree:
         else:
             tei_element.text = data
 
-    def segmonto_taxonomy(self, filepaths):
-        # List all the SegmOnto tags and a URL pointing to their description.
-        SegmOntoZones = {
-                "CustomZone":"https://segmonto.github.io/gd/gdZ/CustomZone/",
-                "DamageZone":"https://segmonto.github.io/gd/gdZ/DamageZone",
-                "DecorationZone":"https://segmonto.github.io/gd/gdZ/DecorationZone",
-                "DigitizationArtefactzone":"https://segmonto.github.io/gd/gdZ/DigitizationArtefactzone",
-                "DropCapitalZone":"https://segmonto.github.io/gd/gdZ/DropCapitalZone",
-                "MainZone":"https://segmonto.github.io/gd/gdZ/MainZone",
-                "MusicZone":"https://segmonto.github.io/gd/gdZ/MusicZone",
-                "NumberingZone":"https://segmonto.github.io/gd/gdZ/NumberingZone",
-                "QuireMarksZone":"https://segmonto.github.io/gd/gdZ/QuireMarksZone",
-                "RunningTitleZone":"https://segmonto.github.io/gd/gdZ/RunningTitleZone",
-                "SealZone":"https://segmonto.github.io/gd/gdZ/SealZone",
-                "StampZone":"https://segmonto.github.io/gd/gdZ/StampZone",
-                "TableZone":"https://segmonto.github.io/gd/gdZ/TableZone",
-                "TitlePageZone":"https://segmonto.github.io/gd/gdZ/TitlePageZone"
-            }
-        SegmOntoLines = {
-                "CustomLine":"https://segmonto.github.io/gd/gdL/CustomLine/",
-                "DefaultLine":"https://segmonto.github.io/gd/gdL/DefaultLine",
-                "DropCapitalLine":"https://segmonto.github.io/gd/gdL/DropCapitalLine",
-                "HeadingLine":"https://segmonto.github.io/gd/gdL/HeadingLine",
-                "InterlinearLine":"https://segmonto.github.io/gd/gdL/InterlinearLine",
-                "MusicLine":"https://segmonto.github.io/gd/gdL/MusicLine"
-            }
-        
+    def segmonto_taxonomy(self, pages):
         # Get all the tags used on the pages of this document.
-        all_tag_dicts = [labels(f) for f in filepaths]
+        all_tag_dicts = [pages.labels(f) for f in pages.filepaths]
 
         # With regex, extract the main part (string before a colon, if present) of a label in the tag dictionary.
         # And use dictionary comprehension to parse all the labels in the document's tags dictionaries.
-        unique_labels = list(set(re.match(r"(\w+):?(\w+)?#?(\d?)?", value).group(1)\
+        unique_labels = list(set(LABEL.match(value).group(1)\
                                 for dic in all_tag_dicts\
                                 for value in dic.values()))
 
@@ -165,15 +166,15 @@ class FullTree:
         cat_id = {"{http://www.w3.org/XML/1998/namespace}id":"SegmOntoZones"}
         category = etree.SubElement(self.children["taxonomy"], "category", cat_id)
         # Enter into the <category> every zone in the document that is also named in the SemOnto guidelines.
-        for z in set(SegmOntoZones).intersection(set(document_zones)):
-            self.enter_taxonomy_category(category, z, SegmOntoZones[z])
+        for z in set(SEGMONTO_ZONES).intersection(set(document_zones)):
+            self.enter_taxonomy_category(category, z, SEGMONTO_ZONES[z])
         
         # Descending directly from <taxonomy>, create the TEI element <category> for SegmOnto lines.
         cat_id = {"{http://www.w3.org/XML/1998/namespace}id":"SegmOntoLines"}
         category = etree.SubElement(self.children["taxonomy"], "category", cat_id)
         # Enter into the <category> every line in the document that is also named in the SemOnto guidelines.
-        for l in set(SegmOntoLines).intersection(set(document_lines)):
-            self.enter_taxonomy_category(category, l, SegmOntoLines[l])
+        for l in set(SEGMONTO_LINES).intersection(set(document_lines)):
+            self.enter_taxonomy_category(category, l, SEGMONTO_LINES[l])
         return document_zones, document_lines
             
     def enter_taxonomy_category(self, category, tag, url):
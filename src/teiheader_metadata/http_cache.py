@@ -0,0 +1,144 @@
+# -----------------------------------------------------------
+# Code by: Kelly Christensen
+# Python class to keep the responses of the metadata APIs (IIIF, SRU, Sudoc) in a local cache between runs.
+# -----------------------------------------------------------
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import requests
+from src import metrics
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULTS = {"path":"./.cache/metadata.sqlite",  # SQLite file in which the responses are stored
+            "ttl_days":30,  # number of days after which a response is requested again
+            "max_entries":10000}  # number of responses kept, the least recently used are evicted first
+REQUEST_DEFAULTS = {"timeout":30,  # seconds to wait for a server to answer
+                    "retries":3,  # number of times a failed request (connection error, 429 or 5xx) is sent again
+                    "backoff":1.0,  # the n-th retry waits backoff * 2^(n-1) seconds
+                    "per_host":4}  # number of requests sent at the same time to one server
+
+
+class CachedResponse:
+    """The parts of a requests.Response that the metadata classes use.
+    """
+    def __init__(self, url, status_code, content):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class ResponseCache:
+    """Responses to GET requests stored in a SQLite file, keyed by the SHA-256 hash of the request's URL.
+        A stored response is reused until it is older than the TTL. Only successful responses (200) are stored.
+        Requests are sent through one keep-alive session per process, with a timeout and retries with exponential backoff.
+    Args:
+        path (str): path to the SQLite file
+        ttl_days (int): number of days for which a response is reused
+        max_entries (int): number of responses kept
+        offline (boolean): never send a request; use stored responses even if they are expired
+        refresh (boolean): ignore the responses stored before this run and request them again
+        request_settings (dict): timeout, retries, backoff and per_host, overriding REQUEST_DEFAULTS
+    """
+
+    def __init__(self, path, ttl_days, max_entries, offline=False, refresh=False, request_settings=None):
+        self.path = path
+        self.ttl = ttl_days * 24 * 60 * 60
+        self.max_entries = max_entries
+        self.offline = offline
+        self.refresh = refresh
+        self.requests = dict(REQUEST_DEFAULTS, **(request_settings or {}))
+        self.local = threading.local()
+        self.http = None
+        self.pid = None
+        self.lock = threading.Lock()
+        self.refreshed = set()  # keys requested again by this process in refresh mode
+
+    def connect(self):
+        # a SQLite connection cannot be shared between threads or with a forked worker process, so each thread opens its own
+        if getattr(self.local, "pid", None) != os.getpid():
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.local.connection = sqlite3.connect(self.path, timeout=30)
+            self.local.connection.execute("""CREATE TABLE IF NOT EXISTS responses (
+                                        key TEXT PRIMARY KEY, url TEXT, status INTEGER, body BLOB, fetched REAL, accessed REAL)""")
+            self.local.pid = os.getpid()
+        return self.local.connection
+
+    def session(self):
+        # one pool of keep-alive connections per process, shared by its threads
+        with self.lock:
+            if self.http is None or self.pid != os.getpid():
+                retry = Retry(total=self.requests["retries"], backoff_factor=self.requests["backoff"],
+                              status_forcelist=[429, 500, 502, 503, 504], allowed_methods=["GET"], raise_on_status=False)
+                adapter = HTTPAdapter(max_retries=retry, pool_maxsize=self.requests["per_host"])
+                self.http = requests.Session()
+                self.http.mount("http://", adapter)
+                self.http.mount("https://", adapter)
+                self.pid = os.getpid()
+        return self.http
+
+    def get(self, url):
+        """Return the response to a GET request for the URL, from the cache if possible.
+            In offline mode, a URL that is not in the cache gets an empty response with the status 504.
+        Returns:
+            (CachedResponse): status code and content of the response
+        """
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        now = time.time()
+        db = self.connect()
+        if not self.refresh or key in self.refreshed:
+            row = db.execute("SELECT status, body, fetched FROM responses WHERE key=?", (key,)).fetchone()
+            if row and (self.offline or now - row[2] < self.ttl):
+                with db:
+                    db.execute("UPDATE responses SET accessed=? WHERE key=?", (now, key))
+                metrics.count("metadata_cache_hits")
+                return CachedResponse(url, row[0], row[1])
+        if self.offline:
+            return CachedResponse(url, 504, b"")
+
+        with metrics.span("http"):
+            r = self.session().get(url, timeout=self.requests["timeout"])
+        metrics.count("metadata_requests")
+        self.refreshed.add(key)
+        if r.status_code == 200:
+            with db:
+                db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)", (key, url, r.status_code, r.content, now, now))
+                db.execute("""DELETE FROM responses WHERE key NOT IN (
+                                SELECT key FROM responses ORDER BY accessed DESC LIMIT ?)""", (self.max_entries,))
+        return CachedResponse(url, r.status_code, r.content)
+
+
+cache = ResponseCache(**DEFAULTS)
+configured = None  # settings of the last call to configure()
+
+
+def configure(settings=None, offline=False, refresh=False, request_settings=None):
+    """Set up the cache used by get() for this process.
+    Args:
+        settings (dict): the configuration file's "metadata_cache" section, whose keys override DEFAULTS
+        offline (boolean): never send a request (option --offline)
+        refresh (boolean): request every response again (option --refresh-metadata)
+        request_settings (dict): the configuration file's "metadata_requests" section, whose keys override REQUEST_DEFAULTS
+    """
+    global cache, configured
+    options = dict(DEFAULTS, **(settings or {}))
+    # the cache set up with the same settings is kept, with its SQLite connections and keep-alive sessions
+    key = (json.dumps(options, sort_keys=True), offline, refresh, json.dumps(request_settings, sort_keys=True))
+    if key == configured:
+        return
+    cache = ResponseCache(options["path"], options["ttl_days"], options["max_entries"], offline, refresh, request_settings)
+    configured = key
+
+
+def get(url):
+    """Send a GET request for the URL through the metadata cache.
+    """
+    return cache.get(url)
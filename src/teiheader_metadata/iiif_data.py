@@ -4,8 +4,8 @@
 # -----------------------------------------------------------
 
 import os
-import requests
 import re
+from src.teiheader_metadata import http_cache
 
 
 class IIIF:
@@ -16,9 +16,16 @@ class IIIF:
         self.manifest_prefix = iiifURI["manifest_prefix"]
         self.manifest_suffix= iiifURI["manifest_suffix"]
 
+    def url(self):
+        # URI of the document's manifest in the IIIF Presentation API
+        return f"{self.scheme}://{self.server}{self.manifest_prefix}{os.path.basename(self.document)}{self.manifest_suffix}"
+
     def request(self):
         # Request manifest from the IIIF Presentation API
-        r = requests.get(f"{self.scheme}://{self.server}{self.manifest_prefix}{os.path.basename(self.document)}{self.manifest_suffix}")
+        return self.read(http_cache.get(self.url()))
+
+    def read(self, r):
+        # Map each label of the manifest's metadata to its value
         try:
             response = {d["label"]:d["value"] for d in r.json()["metadata"]}
         except:
@@ -0,0 +1,74 @@
+# -----------------------------------------------------------
+# Code by: Kelly Christensen
+# Python class to request the metadata of many documents at the same time before their <teiHeader> is built.
+# -----------------------------------------------------------
+
+import asyncio
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from lxml import etree
+from src.teiheader_metadata import http_cache
+from src.teiheader_metadata.iiif_data import IIIF
+from src.queries import SUBFIELD, first
+from src.teiheader_metadata.sru_data import SRU, repositories
+
+
+class Prefetch:
+    """Request the IIIF manifest, the SRU record and the Sudoc page of many documents concurrently, through the
+        metadata cache, so that Metadata.prepare() later finds every response in it. For one document the three
+        requests are chained (each needs the previous response); different documents are requested at the same time,
+        with at most "per_host" requests open on one server. Requests go through the cache's keep-alive session,
+        with its timeout and retries. The Sudoc page of a repository is requested once, however many documents it holds,
+        and not at all if the repository is already known.
+    Args:
+        documents (list): names of the documents' directories (ARKs)
+        iiifURI (dict): the configuration file's "iiifURI" section
+    """
+
+    def __init__(self, documents, iiifURI):
+        self.documents = documents
+        self.iiifURI = iiifURI
+        self.per_host = http_cache.cache.requests["per_host"]
+        self.limits = None
+        self.pool = None
+        self.sudoc = {}  # RCR number -> task requesting its Sudoc page
+
+    def run(self):
+        """Request the metadata of every document.
+        Returns:
+            failures (dict): document name -> exception, for the documents whose requests failed
+        """
+        return asyncio.run(self.request_all())
+
+    async def request_all(self):
+        self.limits = defaultdict(lambda: asyncio.Semaphore(self.per_host))
+        # the cache's requests are blocking, so they are sent from a pool of threads, enough to fill every server's limit
+        with ThreadPoolExecutor(max_workers=self.per_host * 3) as self.pool:
+            results = await asyncio.gather(*[self.request_document(d) for d in self.documents], return_exceptions=True)
+        return {d:r for d, r in zip(self.documents, results) if isinstance(r, Exception)}
+
+    async def get(self, url):
+        async with self.limits[urlsplit(url).netloc]:
+            return await asyncio.get_running_loop().run_in_executor(self.pool, http_cache.get, url)
+
+    async def request_document(self, document):
+        # -- IIIF manifest --
+        iiif = IIIF(document, self.iiifURI)
+        r = await self.get(iiif.url())
+        if r.status_code != 200:
+            return
+        ark = iiif.clean(iiif.read(r))["Catalogue ARK"]
+
+        # -- BnF catalogue record --
+        sru = SRU(ark)
+        r = await self.get(sru.url())
+        if r.status_code != 200:
+            return
+        repository = first(SUBFIELD, etree.fromstring(r.content), tag="930", code="b")
+
+        # -- Sudoc page of the repository --
+        if repository is not None and repository.text not in repositories:
+            if repository.text not in self.sudoc:
+                self.sudoc[repository.text] = asyncio.ensure_future(self.get(SRU.sudoc_url(repository.text)))
+            await self.sudoc[repository.text]
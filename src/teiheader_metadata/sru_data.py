@@ -3,11 +3,26 @@
 # Python class to parse and store data from the BNF's general catalogue.
 # -----------------------------------------------------------
 
+import csv
 from lxml import etree
-import requests
 import re
+from src.queries import NUMBER_OF_RECORDS, CONTROLFIELD, DATAFIELD, SUBFIELD, OWN_SUBFIELD, first
+from src.teiheader_metadata import http_cache
 
-NS = {"s":"http://www.loc.gov/zing/srw/", "m":"info:lc/xmlns/marcxchange-v2"}
+# Settlement and name of every repository already resolved in this run, {RCR number (str): (settlement, repository)};
+# most documents share a handful of repositories, so Sudoc is asked about each one at most once.
+repositories = {}
+
+
+def load_repositories(filepath):
+    """Preload the repositories table from a CSV file with the columns "rcr", "settlement" and "repository",
+        so that the repositories it lists are never requested from Sudoc.
+    Args:
+        filepath (str): path to the CSV file
+    """
+    with open(filepath, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            repositories[row["rcr"].strip()] = (row["settlement"].strip(), row["repository"].strip())
 
 
 class SRU:
@@ -16,6 +31,15 @@ class SRU:
             ark (string): document ARK in BnF catalogue"""
         self.ark = ark
 
+    def url(self):
+        # URI of the search for the document's ARK in the BnF's SRU API
+        return f'http://catalogue.bnf.fr/api/SRU?version=1.2&operation=searchRetrieve&query=(bib.persistentid all "{self.ark}")'
+
+    @staticmethod
+    def sudoc_url(num_rcr):
+        # URI of the Sudoc search results page for a repository's RCR number
+        return f"http://www.sudoc.abes.fr/cbs/xslt//DB=2.2/CMD?ACT=SRCHA&IKT=8888&SRT=RLV&TRM={num_rcr}"
+
     def request(self):
             """Request metadata from the BnF's SRU API.
             Returns:
@@ -23,9 +47,14 @@ class SRU:
                 perfect_match (boolean): True if request was completed with Gallica ark / directory basename
             """    
             print("|        requesting data from BnF's SRU API")
-            r = requests.get(f'http://catalogue.bnf.fr/api/SRU?version=1.2&operation=searchRetrieve&query=(bib.persistentid all "{self.ark}")')
+            r = http_cache.get(self.url())
+            if r.status_code != 200:
+                root = None
+                perfect_match = False
+                print(f"|        \33[31mdid not receive a response from the BnF catalogue (status {r.status_code})\x1b[0m")
+                return root, perfect_match
             root = etree.fromstring(r.content)
-            if root.find('.//s:numberOfRecords', namespaces=NS).text=="0":
+            if first(NUMBER_OF_RECORDS, root).text=="0":
                 perfect_match = False
                 print(f"|        \33[31mdid not find digitised document in BnF catalogue\x1b[0m")
             else:
@@ -47,17 +76,17 @@ class SRU:
         {data.setdefault(f, None) for f in fields}
         
         # -- identifier (700s subfield "o") --
-        has_isni = author_element.find('m:subfield[@code="o"]', namespaces=NS)
+        has_isni = first(OWN_SUBFIELD, author_element, code="o")
         if has_isni is not None and has_isni.text[0:4]=="ISNI":
             data["isni"] = has_isni.text[4:]
 
         # -- primary name (700s subfield "a") --
-        has_primaryname = author_element.find('m:subfield[@code="a"]', namespaces=NS)
+        has_primaryname = first(OWN_SUBFIELD, author_element, code="a")
         if has_primaryname is not None:
             data["primary_name"] = has_primaryname.text
 
         # -- secondary name (700s subfield "b") --
-        has_secondaryname = author_element.find('m:subfield[@code="b"]', namespaces=NS)
+        has_secondaryname = first(OWN_SUBFIELD, author_element, code="b")
         if has_secondaryname is not None:
             x = re.search(r"(?:van der)|(?:de la)|(?:de)|(?:du)|(?:von)|(?:van)", has_secondaryname.text)
             if x:
@@ -96,70 +125,82 @@ class SRU:
             data["authors"] = self.clean_authors(root)
 
             # enter link to the work in the institution's catalogue
-            has_ptr = root.find('.//m:controlfield[@tag="003"]', namespaces=NS)
+            has_ptr = first(CONTROLFIELD, root, tag="003")
             if has_ptr is not None:
                 data["ptr"] = has_ptr.text
             
             # enter date of publication
-            has_date_100 = root.find('.//m:datafield[@tag="100"]/m:subfield[@code="a"]', namespaces=NS)
+            has_date_100 = first(SUBFIELD, root, tag="100", code="a")
             if has_date_100 is not None and has_date_100.text[8]!="u":
                 data["date"] = has_date_100.text[9:13]
                 data["when"] = has_date_100.text[9:13]
                 data["date_cert"] = self.date_cert(has_date_100.text[8])
                 data["date_resp"] = "BNF"
             else:
-                has_date_210 = root.find('.//m:datafield[@tag="210"]/m:subfield[@code="d"]', namespaces=NS)
+                has_date_210 = first(SUBFIELD, root, tag="210", code="d")
                 if has_date_210 is not None:
                     data["date"] = has_date_210.text
             
             
             # enter language of document
-            has_lang = root.find('.//m:datafield[@tag="101"]/m:subfield[@code="a"]', namespaces=NS)
+            has_lang = first(SUBFIELD, root, tag="101", code="a")
             if has_lang is not None:
                 data["lang"] = has_lang.text
 
             # enter country code of publication place
-            has_place_key = root.find('.//m:datafield[@tag="102"]/m:subfield[@code="a"]', namespaces=NS)
+            has_place_key = first(SUBFIELD, root, tag="102", code="a")
             if has_place_key is not None:
                 data["pubplace_key"] = has_place_key.text
 
             # enter cleaned title
-            has_title = root.find('.//m:datafield[@tag="200"]/m:subfield[@code="a"]', namespaces=NS)
+            has_title = first(SUBFIELD, root, tag="200", code="a")
             if has_title is not None:
                 data["title"] = has_title.text
 
             # enter type of document (manuscript or print)
-            has_objectdesc = root.find('.//m:datafield[@tag="200"]/m:subfield[@code="b"]', namespaces=NS)
+            has_objectdesc = first(SUBFIELD, root, tag="200", code="b")
             if has_objectdesc is not None:
                 data["objectdesc"] = has_objectdesc.text
 
             # enter publication place
-            has_place = root.find('.//m:datafield[@tag="210"]/m:subfield[@code="a"]', namespaces=NS)
+            has_place = first(SUBFIELD, root, tag="210", code="a")
             if has_place is not None:
                 data["pubplace"] = has_place.text
 
             # enter publisher
-            has_publisher = root.find('.//m:datafield[@tag="210"]/m:subfield[@code="c"]', namespaces=NS)
+            has_publisher = first(SUBFIELD, root, tag="210", code="c")
             if has_publisher is not None:
                 data["publisher"] = has_publisher.text   
 
             # enter country where the document is conserved
-            has_country = root.find('.//m:datafield[@tag="801"]/m:subfield[@code="a"]', namespaces=NS)
+            has_country = first(SUBFIELD, root, tag="801", code="a")
             if has_country is not None:
                 data["country"] = has_country.text
 
             # enter catalogue number of the document in the insitution
-            has_isno = root.find('.//m:datafield[@tag="930"]/m:subfield[@code="a"]', namespaces=NS)
+            has_isno = first(SUBFIELD, root, tag="930", code="a")
             if has_isno is not None:
                 data["idno"] = has_isno.text
 
-            has_repo = root.find('.//m:datafield[@tag="930"]/m:subfield[@code="b"]', namespaces=NS)
+            has_repo = first(SUBFIELD, root, tag="930", code="b")
             if has_repo is not None:
                 data["settlement"], data["repo"] = self.request_sudoc_data(has_repo.text)
 
         return data
     
     def request_sudoc_data(self, num_rcr):
+        """Get the settlement and name of the repository whose RCR number was found in the Unimarc 930B data,
+            from the repositories already resolved in this run or else from Sudoc.
+        """
+        if num_rcr in repositories:
+            print(f"|        \33[32musing known city and repository for RCR {num_rcr}\x1b[0m")
+            return repositories[num_rcr]
+        settlement, repository = self.parse_sudoc_data(num_rcr)
+        if settlement and repository:
+            repositories[num_rcr] = (settlement, repository)
+        return settlement, repository
+
+    def parse_sudoc_data(self, num_rcr):
         """Request and parse a search results page from SUDOC for the repository whose RCR number was found in the Unimarc 930B data.
         Example of the relevant HTML from the SUDOC results page:
             <tr>
@@ -175,7 +216,7 @@ class SRU:
         """
         # Get the HTML from the search result for the institution's RCR number from Sudoc
         print("|        requesting data from Sudoc")
-        r = requests.get(f"http://www.sudoc.abes.fr/cbs/xslt//DB=2.2/CMD?ACT=SRCHA&IKT=8888&SRT=RLV&TRM={num_rcr}")
+        r = http_cache.get(self.sudoc_url(num_rcr))
         if r.status_code == 200:
             # Parse the HTML into an etree document
             doc = etree.HTML(r.content)
@@ -234,14 +275,14 @@ class SRU:
         """
         authors = []
         count = 0
-        if root.find('.//m:datafield[@tag="700"]', namespaces=NS) is not None:
+        if first(DATAFIELD, root, tag="700") is not None:
             # datafield 700 is not repeatable
-            author_element = root.find('.//m:datafield[@tag="700"]', namespaces=NS)
+            author_element = first(DATAFIELD, root, tag="700")
             count+=1
             authors.append(self.author_data(author_element, count))
-        if root.find('.//m:datafield[@tag="701"]', namespaces=NS) is not None:
+        if first(DATAFIELD, root, tag="701") is not None:
             # datafield 701 is repeatable
-            author_elements = root.findall('.//m:datafield[@tag="701"]', namespaces=NS)
+            author_elements = DATAFIELD(root, tag="701")
             for element in author_elements:
                 count+=1
                 authors.append(self.author_data(element, count))
@@ -1,9 +1,32 @@
 # -----------------------------------------------------------
 # Code by: Kelly Christensen
-# Python class to parse and store data from text in the <sourceDoc>.
+# Python class to parse and store data from text in the <sourceDoc>, or directly from the ALTO files.
 # -----------------------------------------------------------
 
-from collections import namedtuple
+from itertools import chain, count
+from src.order_files import Files
+from src.page_cache import PageCache
+from src.sourcedoc_attributes import Attributes, zone_labels
+from src.sourcedoc_reader import records
+
+XML_ID = "{http://www.w3.org/XML/1998/namespace}id"
+TEXT_RECORDS = ["TextBlock", "TextLine", "String", "Glyph"]  # layout elements read for the text of the lines
+
+
+class Line:
+    """Data of one text line of the <sourceDoc>, as used to build the <body>.
+        Slotted, so that a record takes no more memory than its seven values.
+    """
+    __slots__ = ("id", "n", "text", "line_type", "zone_type", "zone_id", "page_id")
+
+    def __init__(self, id, n, text, line_type, zone_type, zone_id, page_id):
+        self.id = id  # @xml:id of the line's zone
+        self.n = n  # line number
+        self.text = text  # text content of line
+        self.line_type = line_type  # @type of line
+        self.zone_type = zone_type  # @type of text block zone
+        self.zone_id = zone_id  # @xml:id of text block zone
+        self.page_id = page_id  # @xml:id of page
 
 
 class Text:
@@ -12,19 +35,186 @@ class Text:
         self.data = self.line_data()
 
     def line_data(self):
-        """Parse contextual and attribute data for each text line and store it in a named tuple.
-        Returns:
-            data (list of named tuples): list of data for each text line
-        """ 
-        Line = namedtuple("Line", ["id", "n", "text", "line_type", "zone_type", "zone_id", "page_id"])
-        data = [Line(
-            ln.getparent().get("{http://www.w3.org/XML/1998/namespace}id"),  # @xml:id of the line's zone
-            ln.get("n"),  # line number
-            ln.text,  # text content of line
-            ln.getparent().get("type"),  # @type of line
-            ln.getparent().getparent().get("type"),  # @type of text block zone
-            ln.getparent().getparent().get("{http://www.w3.org/XML/1998/namespace}id"),  # @xml:id of text block zone
-            ln.getparent().getparent().getparent().get("{http://www.w3.org/XML/1998/namespace}id"),  # @xml:id of page
-        ) for ln in self.root.findall('.//line')]
-        return data
-        
\ No newline at end of file
+        """Parse contextual and attribute data for each text line, one line at a time.
+            Each <surface>, text block <zone> and line <zone> is visited once, and its attributes are read once for all its lines.
+        Yields:
+            (Line): data of the next text line, in document order
+        """
+        for surface in self.root.iter("surface"):
+            page_id = surface.get(XML_ID)
+            for block in surface.iterchildren("zone"):
+                zone_type = block.get("type")
+                zone_id = block.get(XML_ID)
+                for line_zone in block.iterchildren("zone"):
+                    line_id = line_zone.get(XML_ID)
+                    line_type = line_zone.get("type")
+                    for ln in line_zone.iterchildren("line"):
+                        yield Line(line_id, ln.get("n"), ln.text, line_type, zone_type, zone_id, page_id)
+
+
+def line_text(alto_page, textline):
+    """Return the text of an ALTO <TextLine>: the @CONTENT of its first <String> if that <String> holds all the line's text,
+        otherwise the glyphs of its <String> elements, one word per <String>.
+    Args:
+        alto_page (AltoPage): parsed and indexed XML tree of the ALTO file
+        textline (etree_Element): the <TextLine>
+    Returns:
+        (str): the line's text, or None if the line has none
+    """
+    first_string = alto_page.first(textline, "String")
+    content = first_string.get("CONTENT")
+    if content is not None and len(first_string) == 0:
+        return content
+    if content is not None and content != "" and len(first_string) > 0:
+        words = ""
+        for string in alto_page.children(textline, "String"):
+            glyphs = "".join([g.get("CONTENT") for g in alto_page.children(string, "Glyph")])
+            words = glyphs if words == "" else words + " " + glyphs
+        return words or content
+    return None
+
+
+def text_blocks(alto_page):
+    """Walk the text blocks of one ALTO file and their lines in document order, numbered as in the <sourceDoc>:
+        the blocks and the lines that have an @ID are counted from 1 on each page.
+    Args:
+        alto_page (AltoPage): parsed and indexed XML tree of the ALTO file
+    Yields:
+        block (etree_Element): the next <TextBlock>
+        blocks_on_page (int): its number on the page
+        lines (generator): yields the <TextLine>, its number on the page and its text (see line_text()) of each of the block's lines
+    """
+    blocks_on_page = 0
+    numbers = count(1)  # the lines are numbered across the blocks of the page
+    for block in alto_page.select("PrintSpace", "TextBlock"):
+        if "ID" not in block.attrib:
+            continue
+        blocks_on_page+=1
+        yield block, blocks_on_page, block_lines(alto_page, block, numbers)
+
+
+def block_lines(alto_page, block, numbers):
+    for textline in alto_page.children(block, "TextLine"):
+        if "ID" not in textline.attrib:
+            continue
+        yield textline, next(numbers), line_text(alto_page, textline)
+
+
+def page_lines(document_name, file, tags, config, alto_page, line_zones=True):
+    """Read the text lines of one ALTO file (one page) directly from its parsed tree, without building its <surface>.
+        The lines, their numbers, texts and the xml:ids they refer to are the same as those of the <line> elements
+        that page_surface() would create.
+    Args:
+        file (File): folio number and path of the ALTO file
+        tags (dict): label of each tag used in the ALTO file
+        config (dict): the configuration file's "iiifURI" section
+        alto_page (AltoPage): parsed and indexed XML tree of the ALTO file
+        line_zones (bool): whether the lines have a <zone>; if not (block granularity), each line refers to its block's <zone>
+    Yields:
+        (Line): data of the next text line, in document order
+    """
+    attributes = Attributes(document_name, file.num, alto_page, tags, config)
+    page_id = f"f{file.num}"
+    for block, blocks_on_page, lines in text_blocks(alto_page):
+        block_id = block.attrib["ID"]
+        zone_type = attributes.labels(block, None)["type"]
+        zone_id = f"{page_id}-{block_id}-blockCount{blocks_on_page}"
+        for textline, lines_on_page, text in lines:
+            if text is None:
+                continue
+            line_id = f"{page_id}-{block_id}-{textline.attrib['ID']}-lineCount{lines_on_page}" if line_zones else zone_id
+            yield Line(line_id, str(lines_on_page), text, attributes.labels(textline, None)["type"], zone_type, zone_id, page_id)
+
+
+def record_lines(document_name, file, tags, source, line_zones=True):
+    """Read the text lines of one ALTO file (one page) incrementally, without parsing its whole tree (see sourcedoc_reader.records()).
+        The lines are the same as those page_lines() reads from the parsed tree.
+    Args:
+        file (File): folio number and path of the ALTO file
+        tags (dict): label of each tag used in the ALTO file
+        source (file): the ALTO file opened in binary mode
+        line_zones (bool): whether the lines have a <zone>; if not (block granularity), each line refers to its block's <zone>
+    Yields:
+        (Line): data of the next text line, in document order
+    """
+    page_id = f"f{file.num}"
+    blocks_on_page = 0
+    lines_on_page = 0
+    block = None  # (tuple) @ID, @type and xml:id of the zone of the current text block, or None if its lines are not read
+    line = None  # (Record) current text line, or None if its text is not read
+    strings = []  # (list) each <String> of the current line and the @CONTENT of its glyphs
+    # the end of the records closes the last line
+    for record in chain(records(source, TEXT_RECORDS), [None]):
+        if record is not None and record.name == "Glyph":
+            if strings and record.parent == strings[-1][0].id:
+                strings[-1][1].append(record.attributes.get("CONTENT"))
+            continue
+        if record is not None and record.name == "String":
+            if line is not None and record.parent == line.id:
+                strings.append((record, []))
+            continue
+
+        # a new block or line closes the current line
+        if line is not None:
+            text = record_text(strings)
+            if text is not None:
+                line_id = f"{page_id}-{block[0]}-{line.id}-lineCount{lines_on_page}" if line_zones else block[2]
+                yield Line(line_id, str(lines_on_page), text, zone_labels(line.attributes, "TextLine", tags, None)["type"],
+                           block[1], block[2], page_id)
+            line = None
+            strings = []
+        if record is None:
+            break
+        if record.name == "TextBlock":
+            block = None
+            # only the text blocks directly in the <PrintSpace> make zones
+            if record.id is not None and record.parent is None:
+                blocks_on_page+=1
+                block = (record.id, zone_labels(record.attributes, "TextBlock", tags, None)["type"],
+                         f"{page_id}-{record.id}-blockCount{blocks_on_page}")
+        elif block is not None and record.id is not None and record.parent == block[0]:
+            lines_on_page+=1
+            line = record
+
+
+def record_text(strings):
+    """Return the text of a line read by record_lines(), as line_text() does from the parsed tree.
+    Args:
+        strings (list): each <String> of the line (Record) and the @CONTENT of its glyphs
+    Returns:
+        (str): the line's text, or None if the line has none
+    """
+    if not strings:
+        return None
+    first_string = strings[0][0]
+    content = first_string.attributes.get("CONTENT")
+    if content is not None and not first_string.children:
+        return content
+    if content is not None and content != "" and first_string.children:
+        words = ""
+        for _, glyphs in strings:
+            glyphs = "".join(glyphs)
+            words = glyphs if words == "" else words + " " + glyphs
+        return words or content
+    return None
+
+
+def alto_lines(document_name, filepath_list, config, pages=None, line_zones=True):
+    """Read the text lines of a document's ALTO files in folio order, for a <body> built without the <line> elements
+        of a <sourceDoc>. A file whose parsed tree is already in memory is read from it and then freed;
+        the others are read incrementally, without parsing their whole tree.
+        If line_zones is False (a <sourceDoc> of block granularity), each line refers to its block's <zone>.
+    Yields:
+        (Line): data of the next text line, in document order
+    """
+    if pages is None:
+        pages = PageCache(filepath_list)
+    for file in Files(document_name, filepath_list).order_files():
+        tags = pages.labels(file.filepath)
+        source = pages.stream(file.filepath)
+        if source is None:
+            yield from page_lines(document_name, file, tags, config, pages.page(file.filepath), line_zones)
+            pages.release(file.filepath)
+        else:
+            with source:
+                yield from record_lines(document_name, file, tags, source, line_zones)
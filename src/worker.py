@@ -0,0 +1,83 @@
+# -----------------------------------------------------------
+# Code by: Kelly Christensen
+# Python functions to keep a conversion worker running, which reads jobs as JSON lines from stdin or a local socket
+# and answers each one with a JSON line, so that the interpreter, the configuration and the caches stay warm between documents.
+# -----------------------------------------------------------
+
+import json
+import os
+import socketserver
+import sys
+import traceback
+
+
+def respond(handle, line):
+    """Run one job and return its response.
+    Args:
+        handle (function): takes a job (dict) and returns its response (dict)
+        line (str): the job, as a JSON object
+    Returns:
+        (str): the response, as a JSON object on one line; a job that cannot be read or that fails gets the status "failed"
+    """
+    job = {}
+    try:
+        job = json.loads(line)
+        if not isinstance(job, dict):
+            raise ValueError("a job must be a JSON object")
+        response = handle(job)
+    except Exception:
+        response = {"status":"failed", "error":traceback.format_exc()}
+    if isinstance(job, dict) and "id" in job:
+        response = dict({"id":job["id"]}, **response)
+    return json.dumps(response)
+
+
+def serve_lines(handle, lines, write):
+    """Answer each job read from a stream of lines, in the order the jobs arrive; blank lines are ignored.
+    Args:
+        handle (function): takes a job (dict) and returns its response (dict)
+        lines (iterable): JSON lines of the jobs
+        write (function): sends the JSON line of a response
+    """
+    for line in lines:
+        if line.strip():
+            write(respond(handle, line) + "\n")
+
+
+class JobHandler(socketserver.StreamRequestHandler):
+    """Connection to the worker's socket, on which a client sends jobs and reads their responses, one JSON line each.
+    """
+
+    def handle(self):
+        def write(response):
+            self.wfile.write(response.encode("utf-8"))
+            self.wfile.flush()
+        serve_lines(self.server.job, (line.decode("utf-8") for line in self.rfile), write)
+
+
+def serve(handle, address=None):
+    """Run the worker until stdin is closed or the process is interrupted.
+        Jobs are converted one at a time; clients of the socket are served one after the other.
+    Args:
+        handle (function): takes a job (dict) and returns its response (dict)
+        address (str): path of the Unix socket to listen on, or None (or "-") to read the jobs from stdin and answer on stdout
+    """
+    if address in (None, "-"):
+        print("\33[32mworker reading jobs from stdin\x1b[0m", file=sys.stderr)
+        def write(response):
+            sys.stdout.write(response)
+            sys.stdout.flush()
+        serve_lines(handle, sys.stdin, write)
+        return
+
+    if os.path.exists(address):
+        os.remove(address)
+    with socketserver.UnixStreamServer(address, JobHandler) as server:
+        server.job = handle
+        print(f"\33[32mworker listening on {address}\x1b[0m", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(address)
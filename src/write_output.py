@@ -3,7 +3,12 @@
 # Python class to generate the output XML-TEI file.
 # -----------------------------------------------------------
 
+import os
 from lxml import etree
+from src import metrics
+
+MARKER = "alto2tei-surfaces"  # text of the comment that holds the place of the <surface> elements while streaming
+
 
 class Write:
     def __init__(self, document, root):
@@ -13,4 +18,69 @@ class Write:
     def write(self):
         with open(f'./data/{self.d}.xml', 'wb') as f:
                 etree.ElementTree(self.r).write(f, encoding="utf-8", xml_declaration=True, pretty_print=True)
-            
+                metrics.count("bytes_written", f.tell())
+
+    def serialize(self):
+        """Serialize the TEI tree exactly as write() would.
+        Returns:
+            (bytes): pretty-printed XML-TEI document
+        """
+        return etree.tostring(etree.ElementTree(self.r), encoding="UTF-8", xml_declaration=True, pretty_print=True)
+
+    def stream(self, surface_group, surfaces, finish=None):
+        """Write the XML-TEI file incrementally: everything that precedes the <surface> elements, then each <surface>
+            as soon as the generator has built it (after which it is removed from the tree and freed), then everything
+            that follows. Only one page of the <sourceDoc> is held in memory, and the file is identical to the one write() makes.
+            The document is written to a temporary file next to the XML-TEI file, which replaces it only once the document
+            is complete, so that a page that fails leaves the last output as it was.
+        Args:
+            surface_group (etree_Element): the <sourceDoc> of the TEI tree, to which the generator adds each <surface>
+            surfaces (generator): yields each <surface> once it has been built
+            finish (function): called after the last <surface> to add the elements that follow the <sourceDoc> (eg. <body>)
+        """
+        level = len(list(surface_group.iterancestors())) + 1
+        marker = etree.Comment(MARKER)
+        output = f'./data/{self.d}.xml'
+        partial = f'{output}.tmp'
+        try:
+            self.stream_to(partial, surface_group, surfaces, finish, level, marker)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        os.replace(partial, output)
+
+    def stream_to(self, path, surface_group, surfaces, finish, level, marker):
+        """Write the XML-TEI document to the given file as the generator builds its <surface> elements, see stream().
+        """
+        indentation = b"  " * level
+        with open(path, 'wb') as f:
+            count = 0
+            for surface in surfaces:
+                surface_group.remove(surface)
+                if count == 0:
+                    # write the part of the document that precedes the first <surface>
+                    f.write(self.split(surface_group, marker)[0].rstrip(b" "))
+                # reproduce the indentation that pretty printing the whole tree would have given the <surface>
+                etree.indent(surface, space="  ", level=level)
+                surface.tail = None
+                f.write(indentation + etree.tostring(surface, encoding="UTF-8", xml_declaration=False) + b"\n")
+                count += 1
+            if finish:
+                finish()
+            if count == 0:
+                # an empty <sourceDoc> is written the same way as by write()
+                f.write(self.serialize())
+            else:
+                f.write(self.split(surface_group, marker)[1].lstrip(b"\n"))
+            metrics.count("bytes_written", f.tell())
+
+    def split(self, surface_group, marker):
+        """Serialize the TEI tree with a placeholder comment in the <sourceDoc> and split the result around it.
+        Returns:
+            (list): the serialized document before and after the placeholder
+        """
+        surface_group.append(marker)
+        parts = self.serialize().split(etree.tostring(marker))
+        surface_group.remove(marker)
+        return parts
@@ -0,0 +1,216 @@
+# -----------------------------------------------------------
+# Code by: Kelly Christensen
+# Python tests of the metadata cache and of the concurrent prefetch, against a local HTTP server standing in for the APIs.
+# usage: python -m pytest tests
+# -----------------------------------------------------------
+
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+import pytest
+from src.teiheader_metadata import http_cache, prefetch_data, sru_data
+from src.teiheader_metadata.http_cache import ResponseCache
+from src.teiheader_metadata.prefetch_data import Prefetch
+from src.teiheader_metadata.sru_data import SRU
+
+FAST = {"retries":3, "backoff":0, "timeout":5, "per_host":2}  # request settings that do not wait between retries
+DELAY = 0.2  # seconds the stand-in takes to answer a request under /slow/
+SRU_RECORD = """<srw:searchRetrieveResponse xmlns:srw="http://www.loc.gov/zing/srw/">
+  <srw:numberOfRecords>1</srw:numberOfRecords>
+  <srw:records><srw:record><srw:recordData>
+    <mxc:record xmlns:mxc="info:lc/xmlns/marcxchange-v2">
+      <mxc:datafield tag="930"><mxc:subfield code="b">{rcr}</mxc:subfield></mxc:datafield>
+    </mxc:record>
+  </srw:recordData></srw:record></srw:records>
+</srw:searchRetrieveResponse>"""
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """Answers for the paths used by the tests:
+        /ok/{name}: 200 with a body naming the path and how many times it was requested
+        /missing/{name}: 404
+        /flaky/{name}: 503 to the first two requests, then 200
+        /slow/iiif/{document}: a IIIF manifest after DELAY seconds, whose catalogue ARK is the document's name
+        /slow/sru?...: a SRU record after DELAY seconds, whose repository (930$b) is the part of the ARK after "_"
+        /slow/sudoc?...: a Sudoc page after DELAY seconds
+    """
+
+    def do_GET(self):
+        server = self.server
+        path = self.path
+        with server.lock:
+            server.hits[path] += 1
+            hits = server.hits[path]
+            server.open += 1
+            server.most_open = max(server.most_open, server.open)
+        try:
+            if path.startswith("/slow/"):
+                time.sleep(DELAY)
+            if path.startswith("/ok/"):
+                self.answer(200, f"{path} {hits}".encode("utf-8"))
+            elif path.startswith("/flaky/"):
+                self.answer(200 if hits > 2 else 503, f"{path} {hits}".encode("utf-8"))
+            elif path.startswith("/slow/iiif/"):
+                document = path.rsplit("/", 1)[1]
+                manifest = {"metadata":[{"label":"Relation", "value":f"https://gallica.bnf.fr/ark:/12148/{document}"}]}
+                self.answer(200, json.dumps(manifest).encode("utf-8"))
+            elif path.startswith("/slow/sru"):
+                ark = parse_qs(urlsplit(path).query)["ark"][0]
+                self.answer(200, SRU_RECORD.format(rcr=ark.rsplit("_", 1)[1]).encode("utf-8"))
+            elif path.startswith("/slow/sudoc"):
+                self.answer(200, b"<html></html>")
+            else:
+                self.answer(404, b"")
+        finally:
+            with server.lock:
+                server.open -= 1
+
+    def answer(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    """Run the stand-in on a free local port for one test.
+    Yields:
+        (ThreadingHTTPServer): with "url" (its base URL), "hits" (path -> number of requests) and "most_open"
+                               (largest number of requests answered at the same time)
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.hits = Counter()
+    server.open = 0
+    server.most_open = 0
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval":0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def new_cache(tmp_path, ttl_days=30, max_entries=100, offline=False, refresh=False):
+    return ResponseCache(str(tmp_path / "metadata.sqlite"), ttl_days, max_entries, offline, refresh, FAST)
+
+
+def test_response_is_reused(server, tmp_path):
+    cache = new_cache(tmp_path)
+    first = cache.get(f"{server.url}/ok/a")
+    second = cache.get(f"{server.url}/ok/a")
+    assert first.status_code == second.status_code == 200
+    assert second.content == first.content == b"/ok/a 1"
+    assert server.hits["/ok/a"] == 1
+
+
+def test_response_is_kept_between_runs(server, tmp_path):
+    new_cache(tmp_path).get(f"{server.url}/ok/a")
+    assert new_cache(tmp_path).get(f"{server.url}/ok/a").content == b"/ok/a 1"
+    assert server.hits["/ok/a"] == 1
+
+
+def test_expired_response_is_requested_again(server, tmp_path):
+    cache = new_cache(tmp_path, ttl_days=0)
+    cache.get(f"{server.url}/ok/a")
+    assert cache.get(f"{server.url}/ok/a").content == b"/ok/a 2"
+    assert server.hits["/ok/a"] == 2
+
+
+def test_error_is_not_stored(server, tmp_path):
+    cache = new_cache(tmp_path)
+    assert cache.get(f"{server.url}/missing/a").status_code == 404
+    assert cache.get(f"{server.url}/missing/a").status_code == 404
+    assert server.hits["/missing/a"] == 2
+
+
+def test_least_recently_used_response_is_evicted(server, tmp_path):
+    cache = new_cache(tmp_path, max_entries=2)
+    for name in ["a", "b", "a", "c"]:
+        cache.get(f"{server.url}/ok/{name}")
+        time.sleep(0.01)  # distinct access times
+    offline = new_cache(tmp_path, offline=True)
+    assert offline.get(f"{server.url}/ok/a").status_code == 200
+    assert offline.get(f"{server.url}/ok/c").status_code == 200
+    # "b" was the least recently used of the three responses when "c" was stored
+    assert offline.get(f"{server.url}/ok/b").status_code == 504
+
+
+def test_offline_sends_no_request(server, tmp_path):
+    cache = new_cache(tmp_path, offline=True)
+    response = cache.get(f"{server.url}/ok/a")
+    assert (response.status_code, response.content) == (504, b"")
+    assert server.hits["/ok/a"] == 0
+
+
+def test_offline_uses_expired_response(server, tmp_path):
+    new_cache(tmp_path, ttl_days=0).get(f"{server.url}/ok/a")
+    assert new_cache(tmp_path, ttl_days=0, offline=True).get(f"{server.url}/ok/a").content == b"/ok/a 1"
+    assert server.hits["/ok/a"] == 1
+
+
+def test_refresh_requests_each_response_once(server, tmp_path):
+    new_cache(tmp_path).get(f"{server.url}/ok/a")
+    cache = new_cache(tmp_path, refresh=True)
+    assert cache.get(f"{server.url}/ok/a").content == b"/ok/a 2"
+    # the response requested again in this run is then taken from the cache
+    assert cache.get(f"{server.url}/ok/a").content == b"/ok/a 2"
+    assert server.hits["/ok/a"] == 2
+
+
+def test_failed_request_is_retried(server, tmp_path):
+    cache = new_cache(tmp_path)
+    response = cache.get(f"{server.url}/flaky/a")
+    assert (response.status_code, response.content) == (200, b"/flaky/a 3")
+    assert server.hits["/flaky/a"] == 3
+
+
+def test_configure_keeps_cache_with_same_settings(tmp_path, monkeypatch):
+    monkeypatch.setattr(http_cache, "cache", http_cache.cache)
+    monkeypatch.setattr(http_cache, "configured", None)
+    settings = {"path":str(tmp_path / "metadata.sqlite")}
+    http_cache.configure(settings, request_settings=FAST)
+    cache = http_cache.cache
+    http_cache.configure(settings, request_settings=FAST)
+    assert http_cache.cache is cache
+    http_cache.configure(settings, offline=True, request_settings=FAST)
+    assert http_cache.cache is not cache and http_cache.cache.offline
+
+
+def test_prefetch_is_concurrent_and_cached(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(SRU, "url", lambda self: f"{server.url}/slow/sru?ark={self.ark}")
+    monkeypatch.setattr(SRU, "sudoc_url", staticmethod(lambda num_rcr: f"{server.url}/slow/sudoc?rcr={num_rcr}"))
+    # prefetch_data imports the table of repositories from sru_data: both names must refer to the same, empty table
+    repositories = {}
+    monkeypatch.setattr(sru_data, "repositories", repositories)
+    monkeypatch.setattr(prefetch_data, "repositories", repositories)
+    monkeypatch.setattr(http_cache, "cache", http_cache.cache)
+    monkeypatch.setattr(http_cache, "configured", None)
+    http_cache.configure({"path":str(tmp_path / "metadata.sqlite")}, request_settings=FAST)
+    iiifURI = {"scheme":"http", "server":server.url[len("http://"):], "manifest_prefix":"/slow/iiif/", "manifest_suffix":""}
+    # four documents held by two repositories
+    documents = ["bpt6k1_r1", "bpt6k2_r1", "bpt6k3_r2", "bpt6k4_r2"]
+
+    t0 = time.perf_counter()
+    failures = Prefetch(documents, iiifURI).run()
+    seconds = time.perf_counter() - t0
+    assert failures == {}
+    # each document chains three requests; two documents at a time make it about twice as long as one document
+    assert seconds < DELAY * 3 * len(documents) / 2 + 1
+    assert server.most_open == FAST["per_host"]
+    # the Sudoc page of each repository is requested once
+    assert sorted(path for path in server.hits if path.startswith("/slow/sudoc")) == ["/slow/sudoc?rcr=r1", "/slow/sudoc?rcr=r2"]
+    assert all(n == 1 for n in server.hits.values())
+
+    # every response is now in the cache
+    requested = sum(server.hits.values())
+    assert Prefetch(documents, iiifURI).run() == {}
+    assert sum(server.hits.values()) == requested